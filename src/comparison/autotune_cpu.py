@@ -0,0 +1,173 @@
+"""
+CPU Auto-Tuner
+Benchmarks (workers x threads) splits on this machine and reports which one gives the
+best throughput and which the best single-request latency.
+
+Every candidate runs `workers` processes in parallel, each pinned to its own NUMA-local
+cores (see cpu_config.plan_workers) and generating `--images` images with the tiny SD3
+pipeline (or `--model_path`). Results are written to .cache/cpu_autotune.json.
+A candidate whose workers fail, crash (e.g. out of memory) or exceed `--timeout` is reported
+as failed and skipped.
+
+    python src/comparison/autotune_cpu.py
+    python src/comparison/autotune_cpu.py --workers 1 2 4 --images 4
+"""
+import os
+import json
+import time
+import queue
+import argparse
+import multiprocessing as mp
+from cpu_config import available_cpus, plan_workers, format_cpu_list
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+RESULTS_PATH = os.path.join(project_root, ".cache", "cpu_autotune.json")
+
+PROMPT = "A realistic portrait of a man, with brown hair, full lips, and bags under the eyes."
+
+
+def _bench_worker(model_path, numa_node, cores, images, steps, barrier, results):
+    try:
+        results.put(_bench(model_path, numa_node, cores, images, steps, barrier))
+    except Exception as e:
+        # Release the other workers waiting at the barrier
+        barrier.abort()
+        results.put({"error": f"{type(e).__name__}: {e}"})
+
+
+def _bench(model_path, numa_node, cores, images, steps, barrier):
+    # Configure threads/affinity before torch does any parallel work
+    from cpu_config import apply_cpu_config
+    apply_cpu_config(threads=len(cores), interop_threads=1, cores=cores, numa_node=numa_node)
+
+    import torch
+    from diffusers import StableDiffusion3Pipeline
+    pipe = StableDiffusion3Pipeline.from_pretrained(model_path, torch_dtype=torch.float32)
+    pipe.set_progress_bar_config(disable=True)
+
+    def call():
+        pipe(PROMPT, num_inference_steps=steps, guidance_scale=7.0, output_type="np")
+
+    call()  # warm-up
+    barrier.wait()
+
+    start = time.time()
+    latencies = []
+    for _ in range(images):
+        t0 = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - t0)
+    return {"start": start, "end": time.time(), "latencies": latencies}
+
+
+def _collect(procs, results, timeout):
+    """One report per worker, or an error string if a worker crashed or the deadline passed."""
+    reports = []
+    deadline = time.time() + timeout
+    while len(reports) < len(procs):
+        try:
+            reports.append(results.get(timeout=1.0))
+            continue
+        except queue.Empty:
+            pass
+        crashed = [p.exitcode for p in procs if p.exitcode not in (None, 0)]
+        if crashed:
+            return reports, f"worker exited with code {crashed[0]}"
+        if all(p.exitcode == 0 for p in procs):
+            return reports, "worker exited without a result"
+        if time.time() > deadline:
+            return reports, f"timed out after {timeout:.0f}s"
+    errors = [r["error"] for r in reports if "error" in r]
+    return reports, errors[0] if errors else None
+
+
+def benchmark_split(model_path, workers, threads, images, steps, timeout=600):
+    ctx = mp.get_context("spawn")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=_bench_worker, args=(model_path, node, cores, images, steps, barrier, results))
+        for node, cores in plan_workers(workers, threads)
+    ]
+    for p in procs:
+        p.start()
+    reports, error = _collect(procs, results, timeout)
+    if error:
+        barrier.abort()
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+    for p in procs:
+        p.join()
+    if error:
+        return {"workers": workers, "threads": threads, "error": error}
+
+    wall = max(r["end"] for r in reports) - min(r["start"] for r in reports)
+    latencies = [lat for r in reports for lat in r["latencies"]]
+    return {
+        "workers": workers,
+        "threads": threads,
+        "throughput": len(latencies) / wall,  # images/s
+        "latency": sum(latencies) / len(latencies),  # s/image
+    }
+
+
+def candidate_splits(total_cores, worker_counts=None):
+    """All (workers, threads) pairs that use the whole machine without oversubscribing it."""
+    worker_counts = worker_counts or [w for w in (1, 2, 4, 8, 16) if w <= total_cores]
+    return [(w, total_cores // w) for w in worker_counts if total_cores // w >= 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, nargs="+", default=None, help="Worker counts to try")
+    parser.add_argument("--images", type=int, default=3, help="Images per worker")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds per candidate before it counts as failed")
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Pipeline to benchmark (default: tiny SD3 test pipeline)")
+    args = parser.parse_args()
+
+    if args.model_path:
+        model_path = args.model_path
+    else:
+        from tiny_pipeline import ensure_tiny_pipeline
+        model_path = ensure_tiny_pipeline()
+
+    cpus = available_cpus()
+    print(f"CPUs available: {len(cpus)} ({format_cpu_list(cpus)})")
+
+    results = []
+    print(f"\n{'Workers':>8}{'Threads':>9}{'Images/s':>11}{'s/image':>10}")
+    print("-" * 38)
+    for workers, threads in candidate_splits(len(cpus), args.workers):
+        r = benchmark_split(model_path, workers, threads, args.images, args.steps, args.timeout)
+        results.append(r)
+        if "error" in r:
+            print(f"{workers:>8}{threads:>9}  ❌ failed: {r['error']}")
+        else:
+            print(f"{workers:>8}{threads:>9}{r['throughput']:>11.3f}{r['latency']:>10.3f}")
+
+    completed = [r for r in results if "error" not in r]
+    if not completed:
+        print("\n❌ Every configuration failed; nothing to recommend.")
+        return
+    best_throughput = max(completed, key=lambda r: r["throughput"])
+    best_latency = min(completed, key=lambda r: r["latency"])
+    print(f"\n🚀 Best throughput: {best_throughput['workers']} workers x {best_throughput['threads']} threads")
+    print(f"⏱️ Best latency:    {best_latency['workers']} workers x {best_latency['threads']} threads")
+
+    os.makedirs(os.path.dirname(RESULTS_PATH), exist_ok=True)
+    with open(RESULTS_PATH, "w") as f:
+        json.dump({
+            "model_path": model_path,
+            "results": results,
+            "best_throughput": best_throughput,
+            "best_latency": best_latency,
+        }, f, indent=2)
+    print(f"Saved results to {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmarks the optional inference modes against the fp32 eager baseline.
+
+Uses the tiny SD3 pipeline (see tiny_pipeline.py) with a fixed seed, so it runs on CPU
+in seconds and reports both latency and output drift relative to eager:
+
+    python src/comparison/benchmark_inference_modes.py
+    python src/comparison/benchmark_inference_modes.py --modes int8 bf16 int8,compile --runs 5
+"""
+import argparse
+import time
+import numpy as np
+import torch
+from diffusers import StableDiffusion3Pipeline
+from tiny_pipeline import ensure_tiny_pipeline
+from inference_modes import parse_modes, profile_name, apply_inference_modes, inference_context
+
+PROMPT = "A realistic portrait of a woman, with wavy hair, arched eyebrows, and a smile."
+DEFAULT_MODES = ["eager", "int8", "bf16", "compile", "channels_last"]
+
+
+def run_mode(model_path, modes, seed, steps, runs):
+    """Returns (mean latency in s, first-run latency in s, output array)."""
+    pipe = StableDiffusion3Pipeline.from_pretrained(model_path, torch_dtype=torch.float32)
+    pipe.set_progress_bar_config(disable=True)
+    modes = apply_inference_modes(pipe, modes, "cpu")
+
+    def call():
+        with inference_context(modes, "cpu"):
+            return pipe(
+                PROMPT,
+                num_inference_steps=steps,
+                guidance_scale=7.0,
+                generator=torch.Generator("cpu").manual_seed(seed),
+                output_type="np",
+            ).images[0]
+
+    # First call includes compilation for "compile"; reported separately
+    t0 = time.perf_counter()
+    output = call()
+    first = time.perf_counter() - t0
+
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        call()
+        timings.append(time.perf_counter() - t0)
+    return float(np.mean(timings)), first, output
+
+
+def drift(output, reference):
+    diff = np.abs(output.astype(np.float64) - reference.astype(np.float64))
+    mse = float(np.mean(diff ** 2))
+    psnr = float("inf") if mse == 0 else 10 * np.log10(1.0 / mse)
+    return float(diff.max()), float(diff.mean()), psnr
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modes", nargs="+", default=DEFAULT_MODES,
+                        help="Modes to compare; combine with commas, e.g. int8,compile")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Pipeline to benchmark (default: tiny SD3 test pipeline)")
+    args = parser.parse_args()
+
+    model_path = args.model_path or ensure_tiny_pipeline()
+
+    baseline_latency, _, reference = run_mode(model_path, [], args.seed, args.steps, args.runs)
+
+    print(f"\n{'Mode':<24}{'Latency':>10}{'1st run':>10}{'Speedup':>9}{'Max |Δ|':>10}{'Mean |Δ|':>10}{'PSNR':>8}")
+    print("-" * 81)
+    for spec in args.modes:
+        modes = parse_modes(spec)
+        if modes:
+            latency, first, output = run_mode(model_path, modes, args.seed, args.steps, args.runs)
+        else:
+            latency, first, output = baseline_latency, baseline_latency, reference
+        max_diff, mean_diff, psnr = drift(output, reference)
+        print(f"{profile_name(modes):<24}{latency:>9.3f}s{first:>9.3f}s{baseline_latency / latency:>8.2f}x"
+              f"{max_diff:>10.4f}{mean_diff:>10.5f}{psnr:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
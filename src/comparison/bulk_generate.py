@@ -0,0 +1,194 @@
+"""
+Bulk Reference Generation
+Headless generation of SD3.5 baseline images for every retained prompt combination
+(celeba_prompt_stats.csv, Count >= --min_matches) across models and seeds.
+
+- Work items are (prompt, model, seed). Items are sharded by a stable hash, so several
+  machines/processes can split the job with --num_shards / --shard_index.
+- Completed items are appended to a JSONL manifest only after the image is on disk.
+  Re-running the same command skips them, so a crashed run resumes where it left off.
+- Items are processed model by model to avoid reloading pipelines.
+- Progress lines report throughput and ETA.
+
+    python src/comparison/bulk_generate.py --seeds 0 1 2
+    python src/comparison/bulk_generate.py --models medium --num_shards 4 --shard_index 0
+"""
+import os
+import sys
+import csv
+import json
+import time
+import zlib
+import argparse
+import threading
+from sd35_runner import SDRunner
+from constants import HF_TOKEN
+from perf_store import PerfStore, make_record
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+PROMPT_GENERATOR_DIR = os.path.join(project_root, "src", "prompt_generator")
+sys.path.append(PROMPT_GENERATOR_DIR)
+from prompt_templates import DEFAULT_TEMPLATE
+
+PROMPT_STATS_CSV = os.path.join(PROMPT_GENERATOR_DIR, "celeba_prompt_stats.csv")
+OUTPUT_ROOT = "out/reference"
+PERF_COMPACT_EVERY = 500  # fold performance records into Parquet every N items
+
+# Same defaults as the comparison dashboard
+MODELS = {
+    "large": {"name": "Large", "id": "stabilityai/stable-diffusion-3.5-large", "steps": 28, "guidance": 7.0},
+    "large_turbo": {"name": "Large Turbo", "id": "stabilityai/stable-diffusion-3.5-large-turbo", "steps": 4, "guidance": 2.0},
+    "medium": {"name": "Medium", "id": "stabilityai/stable-diffusion-3.5-medium", "steps": 28, "guidance": 7.0},
+}
+
+
+def load_prompt_index(path=PROMPT_STATS_CSV, min_matches=200):
+    """Retained prompt combinations: [{gender, attributes, count, prompt}, ...]."""
+    prompts = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            count = int(row["Count"])
+            if count < min_matches:
+                continue
+            prompts.append({
+                "gender": row["Gender"],
+                "attributes": [row["Attribute_1"], row["Attribute_2"], row["Attribute_3"]],
+                "count": count,
+            })
+    texts = DEFAULT_TEMPLATE.render_batch([p["gender"] for p in prompts], [p["attributes"] for p in prompts])
+    for prompt, text in zip(prompts, texts):
+        prompt["prompt"] = text
+    return prompts
+
+
+def build_work_items(prompts, model_suffixes, seeds, num_shards=1, shard_index=0):
+    """All (prompt, model, seed) items of this shard, grouped by model."""
+    items = []
+    for suffix in model_suffixes:
+        for p in prompts:
+            prompt_key = f"{p['gender']}_{'-'.join(p['attributes'])}"
+            for seed in seeds:
+                key = f"{suffix}/{prompt_key}/seed{seed}"
+                if zlib.crc32(key.encode()) % num_shards != shard_index:
+                    continue
+                items.append({**p, "key": key, "model": suffix, "seed": seed,
+                              "path": os.path.join(suffix, f"{prompt_key}_s{seed}.png")})
+    return items
+
+
+class Manifest:
+    """Append-only JSONL record of completed items. Safe to call from the image writer threads."""
+
+    def __init__(self, output_dir, num_shards, shard_index):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, f"manifest-{shard_index:03d}-of-{num_shards:03d}.jsonl")
+        self.lock = threading.Lock()
+
+    def completed_keys(self):
+        """Keys recorded as ok in any manifest in the output dir (shard layout may have changed)."""
+        done = set()
+        for name in os.listdir(self.output_dir):
+            if not (name.startswith("manifest-") and name.endswith(".jsonl")):
+                continue
+            with open(os.path.join(self.output_dir, name)) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn last line from a crash
+                    if record.get("status") == "ok":
+                        done.add(record["key"])
+        return done
+
+    def record(self, entry):
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+
+def format_eta(seconds):
+    hours, rem = divmod(int(seconds), 3600)
+    minutes, secs = divmod(rem, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def run(args):
+    os.makedirs(args.output_dir, exist_ok=True)
+    prompts = load_prompt_index(args.prompt_csv, args.min_matches)
+    items = build_work_items(prompts, args.models, args.seeds, args.num_shards, args.shard_index)
+
+    manifest = Manifest(args.output_dir, args.num_shards, args.shard_index)
+    done = manifest.completed_keys()
+    pending = [item for item in items if item["key"] not in done]
+
+    print(f"Prompts: {len(prompts):,} | Shard {args.shard_index + 1}/{args.num_shards}: {len(items):,} items, "
+          f"{len(items) - len(pending):,} already done, {len(pending):,} to go")
+    if not pending:
+        return
+
+    runner = SDRunner(output_dir=args.output_dir, auth_token=HF_TOKEN)
+    perf_store = PerfStore()
+    start = time.time()
+    failed = 0
+    try:
+        for i, item in enumerate(pending):
+            model = MODELS[item["model"]]
+            path = os.path.join(args.output_dir, item["path"])
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            entry = {
+                "key": item["key"], "model": item["model"], "model_id": model["id"], "seed": item["seed"],
+                "gender": item["gender"], "attributes": item["attributes"], "prompt": item["prompt"],
+                "steps": model["steps"], "guidance": model["guidance"],
+            }
+            try:
+                # The runner adds "duration" to the metadata; the manifest entry is recorded once the image is on disk
+                _, duration, saved_path = runner.generate(
+                    item["prompt"], model["id"],
+                    steps=model["steps"], guidance_scale=model["guidance"],
+                    output_path=path, seed=item["seed"], metadata=entry,
+                    on_saved=lambda saved_path, metadata: manifest.record({
+                        **metadata, "path": os.path.relpath(saved_path, args.output_dir), "status": "ok"
+                    }),
+                )
+                perf_store.append(make_record(
+                    {**entry, "model": model["name"], "duration": duration, "timings": runner.last_timings},
+                    "bulk", runner.device, runner.profile, path=saved_path
+                ))
+            except Exception as e:
+                failed += 1
+                print(f"❌ {item['key']}: {e}")
+                manifest.record({**entry, "status": "failed", "error": str(e)})
+
+            if (i + 1) % PERF_COMPACT_EVERY == 0:
+                perf_store.compact()
+
+            elapsed = time.time() - start
+            rate = (i + 1) / elapsed
+            print(f"[{i + 1}/{len(pending)}] {item['key']} | {rate * 60:.1f} img/min | "
+                  f"ETA {format_eta((len(pending) - i - 1) / rate)}")
+    finally:
+        # Flush queued writes so their manifest entries are recorded before exit
+        runner.close()
+        perf_store.compact()
+
+    print(f"\n✨ Done: {len(pending) - failed:,} generated, {failed:,} failed in {format_eta(time.time() - start)}.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--min_matches", type=int, default=200)
+    parser.add_argument("--prompt_csv", type=str, default=PROMPT_STATS_CSV)
+    parser.add_argument("--output_dir", type=str, default=OUTPUT_ROOT)
+    parser.add_argument("--num_shards", type=int, default=1)
+    parser.add_argument("--shard_index", type=int, default=0)
+    args = parser.parse_args()
+
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard_index must be in [0, --num_shards)")
+    run(args)
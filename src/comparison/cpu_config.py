@@ -0,0 +1,146 @@
+"""
+CPU Execution Config
+Thread counts, core pinning and NUMA-local memory placement for CPU generation.
+
+Defaults come from .env and can be overridden per worker (see run_batch.py):
+    TORCH_THREADS=16          intra-op threads (0 = torch default)
+    TORCH_INTEROP_THREADS=1   inter-op threads (0 = torch default)
+    CPU_CORES=0-15            cores to pin this worker to
+    NUMA_NODE=0               pin to this NUMA node's cores and bind memory to it
+
+Use autotune_cpu.py to pick a good (workers x threads) split for a machine.
+"""
+import os
+import glob
+import ctypes
+import ctypes.util
+import torch
+from dotenv import load_dotenv
+load_dotenv()
+
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", "0"))
+TORCH_INTEROP_THREADS = int(os.getenv("TORCH_INTEROP_THREADS", "0"))
+CPU_CORES = os.getenv("CPU_CORES", "")
+NUMA_NODE = os.getenv("NUMA_NODE", "")
+
+
+def parse_cpu_list(spec):
+    """'0-3,8,10-11' -> [0, 1, 2, 3, 8, 10, 11] (Linux cpulist format)."""
+    cpus = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpu_list(cpus):
+    return ",".join(str(c) for c in cpus)
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def numa_nodes():
+    """{node_id: [cpus]} from sysfs. Single node with all CPUs if NUMA info is unavailable."""
+    nodes = {}
+    for path in glob.glob("/sys/devices/system/node/node[0-9]*/cpulist"):
+        node_id = int(os.path.basename(os.path.dirname(path))[len("node"):])
+        with open(path) as f:
+            cpus = parse_cpu_list(f.read())
+        if cpus:
+            nodes[node_id] = cpus
+    return dict(sorted(nodes.items())) or {0: available_cpus()}
+
+
+def plan_workers(num_workers, threads_per_worker):
+    """
+    Core lists for `num_workers` workers with `threads_per_worker` cores each.
+    Workers are spread round-robin over NUMA nodes and never straddle a node
+    unless a node has fewer cores than `threads_per_worker`.
+    Returns [(numa_node, [cpus]), ...].
+    """
+    free = {node: list(cpus) for node, cpus in numa_nodes().items()}
+    node_ids = list(free)
+    plan = []
+    for i in range(num_workers):
+        # Prefer the next node in round-robin order that still fits a whole worker
+        candidates = node_ids[i % len(node_ids):] + node_ids[:i % len(node_ids)]
+        node = next((n for n in candidates if len(free[n]) >= threads_per_worker), None)
+        if node is None:
+            node = max(free, key=lambda n: len(free[n]))
+        cores = free[node][:threads_per_worker]
+        free[node] = free[node][threads_per_worker:]
+        if not cores:
+            raise ValueError(f"Not enough cores for {num_workers} workers x {threads_per_worker} threads")
+        plan.append((node, cores))
+    return plan
+
+
+def bind_memory_to_node(node):
+    """Prefer allocations on `node` via libnuma. Returns False if libnuma is unavailable."""
+    lib_name = ctypes.util.find_library("numa")
+    if not lib_name:
+        return False
+    try:
+        libnuma = ctypes.CDLL(lib_name)
+        if libnuma.numa_available() < 0:
+            return False
+        libnuma.numa_set_preferred(int(node))
+        return True
+    except OSError:
+        return False
+
+
+def apply_cpu_config(threads=TORCH_THREADS, interop_threads=TORCH_INTEROP_THREADS,
+                     cores=CPU_CORES, numa_node=NUMA_NODE):
+    """
+    Configure the current process. Call before loading a pipeline.
+    `cores` may be a list or a cpulist string; `numa_node` pins to that node's cores
+    when no explicit cores are given and binds memory to it.
+    Returns a dict describing the applied config.
+    """
+    if isinstance(cores, str):
+        cores = parse_cpu_list(cores)
+    numa_node = int(numa_node) if numa_node not in (None, "") else None
+
+    if numa_node is not None and not cores:
+        cores = numa_nodes().get(numa_node, [])
+
+    if cores:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        else:
+            print("⚠️ Core pinning is not supported on this platform, ignoring cores.")
+
+    memory_bound = False
+    if numa_node is not None:
+        # Without libnuma, Linux first-touch allocation on pinned cores is already node-local
+        memory_bound = bind_memory_to_node(numa_node)
+
+    threads = threads or (len(cores) if cores else 0)
+    if threads:
+        torch.set_num_threads(threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Can only be set once, before any inter-op parallel work
+            print("⚠️ Inter-op threads already initialised, keeping current value.")
+
+    config = {
+        "threads": torch.get_num_threads(),
+        "interop_threads": torch.get_num_interop_threads(),
+        "cores": format_cpu_list(cores) if cores else "all",
+        "numa_node": numa_node,
+        "numa_membind": memory_bound,
+    }
+    return config
@@ -7,6 +7,18 @@ import pandas as pd
 from PIL import Image
 import sys
 import subprocess
+from image_store import find_image, thumbnail_path, output_extension
+from result_channel import read_result
+from model_cache import OFFLINE_MODE, check_offline
+from perf_store import PerfStore, GROUP_KEYS
+from task_scheduler import plan_tasks, format_seconds
+from inference_modes import INFERENCE_MODE, runner_device, expected_profile
+
+# CelebA tooling lives next to the prompt generator
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "prompt_generator"))
+from celeba_embeddings import EmbeddingIndex, EMBEDDING_EXTRACTOR
+from image_features import get_extractor, resolve_image_path
+from rerun_profiler import get_profiler
 
 # IMPORTANT NOTE (keep this in no matter what you change): 
 #     - Please replace `use_container_width` with `width`. 
@@ -16,14 +28,38 @@ import subprocess
 # Configure page
 st.set_page_config(page_title="SD 3.5 Comparison", layout="wide")
 
+# Per-rerun timings (enable with DASHBOARD_PROFILE=True or ?profile=1)
+profiler = get_profiler("comparison_dashboard")
+
 # Constants
 OUTPUT_ROOT = "out/comparison"
 LEGACY_DIR = os.path.join(OUTPUT_ROOT, "legacy")
+IMG_ALIGNED_PATH = "res/img_align_celeba_png"
 
 # Ensure directories exist
 os.makedirs(OUTPUT_ROOT, exist_ok=True)
 os.makedirs(LEGACY_DIR, exist_ok=True)
 
+@st.cache_resource
+def load_embedding_index():
+    """CelebA embedding store + extractor for nearest-face search (None if not built yet)."""
+    if not EmbeddingIndex.exists():
+        return None, None
+    return EmbeddingIndex.load(), get_extractor(EMBEDDING_EXTRACTOR)
+
+
+@profiler.cache_data
+def nearest_faces(img_path, mtime, k=4):
+    """Top-k nearest CelebA faces for a generated image (cached per file version)."""
+    index, extractor = load_embedding_index()
+    return index.search_image(Image.open(img_path), extractor, k=k)
+
+@profiler.cache_data
+def load_perf_tables(version):
+    """Precomputed analytics aggregates (cached until the store is compacted again)."""
+    store = PerfStore()
+    return store.aggregates(), store.daily()
+
 # --- LAYOUT CONTAINERS ---
 # We define these first so we can populate them in a specific order but run logic whenever
 main_container = st.container()
@@ -38,6 +74,10 @@ with main_container:
     
     prompt = st.text_area("Prompt", "A realistic portrait of a young woman with black hair, narrow eyes, and wearing a necklace. Neutral background, natural lighting, close-up face.")
 
+    seed_col1, seed_col2, _ = st.columns(3)
+    num_seeds = seed_col1.number_input("Seeds per model", 1, 16, 1, help="2+ seeds: one image per seed, shown as a grid. The prompt is encoded once and the seeds run in batches.")
+    base_seed = seed_col2.number_input("Base seed", 0, 2**31 - 1, 0, disabled=num_seeds == 1, help="Seeds used: base, base+1, ...")
+
     generate_btn = st.button("Run Comparison", type="primary")
 
     # Model Configuration
@@ -79,13 +119,17 @@ with main_container:
 
 # --- HISTORY DISPLAY (Populate BEFORE generation loop) ---
 # Find all run folders (exclude legacy)
-run_dirs = [d for d in os.listdir(OUTPUT_ROOT) if os.path.isdir(os.path.join(OUTPUT_ROOT, d)) and d != "legacy"]
-run_dirs.sort(reverse=True) # Newest first
+with profiler.section("list runs"):
+    run_dirs = [d for d in os.listdir(OUTPUT_ROOT) if os.path.isdir(os.path.join(OUTPUT_ROOT, d)) and d != "legacy"]
+    run_dirs.sort(reverse=True) # Newest first
 
 all_stats = []
 
-with history_container:
+with history_container, profiler.section("history"):
     st.subheader("History")
+
+    embedding_index, _ = load_embedding_index()
+    show_neighbours = embedding_index is not None and st.toggle("Show nearest CelebA faces")
     
     # Show history items
     for run_id in run_dirs:
@@ -112,13 +156,15 @@ with history_container:
             suffixes = ["large", "large_turbo", "medium"]
             
             for i, suffix in enumerate(suffixes):
-                img_path = os.path.join(full_path, f"{suffix}.png")
+                img_path = find_image(full_path, suffix)
                 # Fix: Check for .json now, not .png.json
                 meta_path = os.path.join(full_path, f"{suffix}.json")
                 
                 with cols[i]:
-                    if os.path.exists(img_path):
-                        st.image(Image.open(img_path), use_container_width=True)
+                    if img_path:
+                        # Prefer the pre-rendered thumbnail; passing a path skips the PIL decode
+                        thumb_path = thumbnail_path(img_path)
+                        st.image(thumb_path if os.path.exists(thumb_path) else img_path, width='stretch')
                         if os.path.exists(meta_path):
                             try:
                                 with open(meta_path, "r") as f:
@@ -131,21 +177,55 @@ with history_container:
                                     sc2.metric("Stp", s['steps'])
                                     sc3.metric("Gdn", s['guidance'])
                             except: pass
+
+                        if show_neighbours:
+                            nn_cols = st.columns(4)
+                            for j, (img_id, score) in enumerate(nearest_faces(img_path, os.path.getmtime(img_path))):
+                                real_path = resolve_image_path(IMG_ALIGNED_PATH, img_id)
+                                if real_path:
+                                    nn_cols[j % 4].image(real_path, caption=f"{score:.2f}", width='stretch')
                     else:
                         st.warning("Missing")
             
             st.divider()
 
 # --- GLOBAL PERFORMANCE STATS (Populate BEFORE generation loop) ---
-with stats_container:
+with stats_container, profiler.section("analytics"):
+    st.subheader("Performance Analytics")
+    perf_store = PerfStore()
+    aggregates, daily = load_perf_tables(perf_store.version())
+
+    if aggregates is not None and not aggregates.empty:
+        # Settings whose recent median latency is clearly above their own history
+        for _, row in aggregates[aggregates["regressed"].fillna(False).astype(bool)].iterrows():
+            st.warning(f"📉 Regression: {row['model']} ({row['steps']} steps, guidance {row['guidance']}, "
+                       f"{row['profile']} on {row['device']}) median {row['baseline_p50']:.1f}s → "
+                       f"{row['recent_p50']:.1f}s ({row['change']:+.0%})")
+
+        latency_df = aggregates[GROUP_KEYS + ["runs", "p50", "p90", "p99", "img_per_min",
+                                              "load_p50", "encode_p50", "denoise_p50", "decode_p50",
+                                              "peak_memory_mb_p50", "change"]]
+        # Peak memory is only measured per run on CUDA (empty for CPU runs)
+        latency_df = latency_df.rename(columns={"peak_memory_mb_p50": "peak_cuda_mb_p50"})
+        st.dataframe(latency_df.round(2), width='stretch', hide_index=True)
+
+        if daily is not None and not daily.empty:
+            st.caption("Throughput over time (images per minute of generation)")
+            st.line_chart(daily.pivot_table(index="day", columns="model", values="img_per_min"))
+    elif run_dirs:
+        st.caption("The analytics store is empty. Past runs can be imported from their JSON sidecars.")
+        if st.button("Import past runs"):
+            perf_store.backfill(OUTPUT_ROOT)
+            st.rerun()
+
     if all_stats:
-        st.subheader("Performance Analytics")
-        
         df = pd.DataFrame(all_stats)
         if not df.empty and "run_id" in df.columns:
+            st.divider()
+
             # 1. Average Speed Metrics (Restored as requested)
             avg_speed = df.groupby("model")["duration"].mean().reset_index()
-            
+
             ac1, ac2, ac3 = st.columns(3)
             # Safe metrics loop
             metrics_cols = [ac1, ac2, ac3]
@@ -153,8 +233,6 @@ with stats_container:
                  # Find correct column index based on model name simple hash or just cycle
                  with metrics_cols[idx % 3]:
                     st.metric(f"Avg Time: {row['model']}", f"{row['duration']:.2f}s")
-            
-            st.divider()
 
             # 2. Pivot Table (The "Table with run_id Large...")
             # Index=Run, Columns=Model, Values=Duration
@@ -170,10 +248,13 @@ with stats_container:
             final_df = final_df.sort_index(ascending=False)
             
             # Display without extra header
-            st.dataframe(final_df, use_container_width=True)
-            
-        else:
-            st.write("No valid data found yet.")
+            st.dataframe(final_df, width='stretch')
+    elif aggregates is None:
+        st.write("No valid data found yet.")
+
+# The perf panel reports the rerun up to here; a generation run below blocks until st.rerun()
+with stats_container:
+    profiler.finish()
 
 # --- GENERATION LOGIC (Runs Last, updates Main) ---
 if generate_btn:
@@ -186,16 +267,31 @@ if generate_btn:
     tasks = []
     # Prepare Tasks
     for config in models_config:
-        filename = f"{config['suffix']}.png"
+        filename = f"{config['suffix']}{output_extension()}"
         filepath = os.path.join(run_dir, filename)
         tasks.append({
             "name": config['name'],
             "id": config['id'],
             "path": filepath,
+            "preview_path": os.path.join(run_dir, f"{config['suffix']}_preview.jpg"),
             "steps": config['steps'],
-            "guidance": config['guidance']
+            "guidance": config['guidance'],
+            "seeds": list(range(base_seed, base_seed + num_seeds)) if num_seeds > 1 else []
         })
+
+    # Same estimate the batch runner prints with its plan (same device and inference profile)
+    device = runner_device()
+    estimate = plan_tasks(tasks, aggregates, device=device, profile=expected_profile(INFERENCE_MODE, device))["estimate"]
+    if estimate is not None:
+        st.caption(f"⏱️ Estimated wall time: ~{format_seconds(estimate)} (from past runs)")
     
+    # Offline: check the cache index before spawning anything
+    if OFFLINE_MODE:
+        problems = [p for config in models_config for p in check_offline(config['id'])[1]]
+        if problems:
+            st.error("Offline mode, but some models are not fully cached:\n\n" + "\n".join(f"- {p}" for p in problems))
+            st.stop()
+
     # Launch Subprocess
     args = [sys.executable, "src/comparison/run_batch.py", "--prompt", prompt, "--tasks", json.dumps(tasks)]
     
@@ -205,30 +301,54 @@ if generate_btn:
         # Poll for results logic (Inline visualization for active run)
         active_placeholders = [col1.empty(), col2.empty(), col3.empty()]
         completed_paths = set()
+        preview_mtimes = {}
         
         progress_bar = st.progress(0)
         
         while process.poll() is None:
             for i, task in enumerate(tasks):
                 path = task['path']
+                preview_path = task['preview_path']
+
+                # Live latent preview while this model is still denoising
+                if path not in completed_paths and os.path.exists(preview_path):
+                    try:
+                        mtime = os.path.getmtime(preview_path)
+                        if preview_mtimes.get(preview_path) != mtime:
+                            preview = Image.open(preview_path)
+                            preview.load()
+                            step_info = preview.info.get("comment", b"").decode()
+                            active_placeholders[i].image(preview, caption=f"Preview · step {step_info}", width='stretch')
+                            preview_mtimes[preview_path] = mtime
+                    except: pass
+
                 # UPDATED: Check for .json
                 meta_path = os.path.splitext(path)[0] + ".json"
-                if path not in completed_paths and os.path.exists(path) and os.path.exists(meta_path):
-                    try:
-                        img = Image.open(path)
-                        img.load()
+                if path in completed_paths:
+                    continue
+                try:
+                    # Fast path: raw pixels straight from the generating process (shared memory)
+                    result = read_result(path)
+                    if result is not None:
+                        img, stats = result
+                    elif os.path.exists(path) and os.path.exists(meta_path):
+                        # Fallback: disk. The sidecar is written last, so the image and thumbnail are complete
                         with open(meta_path, "r") as f: stats = json.load(f)
+                        thumb_path = thumbnail_path(path)
+                        img = thumb_path if os.path.exists(thumb_path) else path
+                    else:
+                        continue
                         
-                        with active_placeholders[i].container():
-                            st.image(img, use_container_width=True)
-                            c_a, c_b, c_c = st.columns(3)
-                            c_a.metric("Time", f"{stats['duration']:.1f}s")
-                            c_b.metric("Steps", stats['steps'])
-                            c_c.metric("Gym", stats['guidance'])
-                        completed_paths.add(path)
-                        progress_bar.progress(len(completed_paths) / len(tasks))
-                    except: pass
-            time.sleep(1)
+                    with active_placeholders[i].container():
+                        st.image(img, width='stretch')
+                        c_a, c_b, c_c = st.columns(3)
+                        c_a.metric("Time", f"{stats['duration']:.1f}s")
+                        c_b.metric("Steps", stats['steps'])
+                        c_c.metric("Gym", stats['guidance'])
+                    completed_paths.add(path)
+                    progress_bar.progress(len(completed_paths) / len(tasks))
+                except: pass
+            time.sleep(0.5)
             
         progress_bar.empty()
         st.success("Generation Complete!")
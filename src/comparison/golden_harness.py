@@ -0,0 +1,214 @@
+"""
+Golden Output Harness
+Regression check for SDRunner generation paths: fixed seeds through the tiny SD3 pipeline
+(see tiny_pipeline.py) on CPU, compared against stored golden latents and images.
+
+    python src/comparison/golden_harness.py record                 # eager fp32 goldens
+    python src/comparison/golden_harness.py check                  # every inference mode
+    python src/comparison/golden_harness.py check --modes eager int8,compile --runs 5
+
+`record` runs each case through SDRunner without inference modes and stores the final latents
+(before the VAE) and the decoded image per seed in .cache/golden/<case>.npz, plus a manifest
+with the torch/diffusers versions and a fingerprint of the tiny pipeline weights.
+Goldens (like the tiny pipeline itself) are local to the machine and git-ignored; record them
+once before changing a generation path, then `check` against them.
+`check` runs the same cases per inference profile and reports speed (vs. eager in the same
+session) next to drift from the goldens; each mode has its own tolerance (TOLERANCES). The
+exit code is 1 if any case is out of tolerance, so it can gate a change.
+
+Cases cover single images (with and without classifier-free guidance) and a seed grid in
+batches of 2, whose images must match the single-image path seed for seed.
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+import torch
+import diffusers
+from sd35_runner import SDRunner
+from tiny_pipeline import ensure_tiny_pipeline
+from inference_modes import parse_modes, profile_name
+from benchmark_inference_modes import PROMPT, DEFAULT_MODES, drift
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+GOLDEN_DIR = os.path.join(project_root, ".cache", "golden")
+STEPS = 4
+
+CASES = {
+    "single_cfg": {"seeds": [0], "guidance": 7.0},
+    "single_nocfg": {"seeds": [1], "guidance": 1.0},
+    "grid_batch2": {"seeds": [0, 2, 3], "guidance": 7.0, "batch_size": 2},
+}
+
+# Per mode: max |Δ| of the final latents relative to their max |value|, and minimum image PSNR (dB).
+# A profile combining modes gets the loosest of its modes.
+TOLERANCES = {
+    "eager": {"latent_rel": 1e-4, "psnr": 60.0},
+    "channels_last": {"latent_rel": 1e-4, "psnr": 50.0},
+    "compile": {"latent_rel": 1e-3, "psnr": 45.0},
+    "int8": {"latent_rel": 0.1, "psnr": 35.0},
+    "bf16": {"latent_rel": 0.1, "psnr": 35.0},
+}
+
+
+def tolerance(modes):
+    tols = [TOLERANCES[m] for m in modes] or [TOLERANCES["eager"]]
+    return {"latent_rel": max(t["latent_rel"] for t in tols), "psnr": min(t["psnr"] for t in tols)}
+
+
+def pipeline_fingerprint(path):
+    """sha1 over every file of a saved pipeline (goldens are only valid for the same weights)."""
+    digest = hashlib.sha1()
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            digest.update(os.path.relpath(os.path.join(root, name), path).encode())
+            with open(os.path.join(root, name), "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def run_case(runner, model_path, case, out_dir):
+    """(seconds, final latents (n, C, H, W) float32, images (n, H, W, 3) uint8) for one case."""
+    seeds = case["seeds"]
+    if len(seeds) > 1:
+        _, images, _, duration, _ = runner.generate_grid(
+            PROMPT, model_path, seeds, steps=STEPS, guidance_scale=case["guidance"],
+            output_path=os.path.join(out_dir, "grid.png"), batch_size=case.get("batch_size"),
+        )
+    else:
+        image, duration, _ = runner.generate(
+            PROMPT, model_path, steps=STEPS, guidance_scale=case["guidance"],
+            output_path=os.path.join(out_dir, "single.png"), seed=seeds[0],
+        )
+        images = [image]
+    return duration, runner.last_latents.numpy(), np.stack([np.asarray(img) for img in images])
+
+
+def run_profile(model_path, modes, runs):
+    """{case: (median seconds, latents, images)} for one inference profile (fresh runner)."""
+    results = {}
+    with tempfile.TemporaryDirectory() as out_dir:
+        runner = SDRunner(output_dir=out_dir, inference_modes=",".join(modes) or "eager")
+        runner.load_model(model_path)
+        runner.pipeline.set_progress_bar_config(disable=True)
+        for name, case in CASES.items():
+            # First call warms up (and compiles for "compile"); it is not timed
+            _, latents, images = run_case(runner, model_path, case, out_dir)
+            durations = [run_case(runner, model_path, case, out_dir)[0] for _ in range(runs)]
+            results[name] = (float(np.median(durations)), latents, images)
+        runner.close()
+    return results
+
+
+def record(model_path, golden_dir, runs):
+    os.makedirs(golden_dir, exist_ok=True)
+    results = run_profile(model_path, [], runs)
+    manifest = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "torch": torch.__version__,
+        "diffusers": diffusers.__version__,
+        "pipeline": pipeline_fingerprint(model_path),
+        "prompt": PROMPT,
+        "steps": STEPS,
+        "cases": {name: {**CASES[name], "seconds": seconds} for name, (seconds, _, _) in results.items()},
+    }
+    for name, (_, latents, images) in results.items():
+        np.savez_compressed(os.path.join(golden_dir, f"{name}.npz"), latents=latents, images=images)
+    with open(os.path.join(golden_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"✅ Recorded {len(results)} golden cases to {golden_dir}")
+
+
+def load_goldens(model_path, golden_dir):
+    manifest_path = os.path.join(golden_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"No goldens in {golden_dir}. Run `golden_harness.py record` first.")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest["pipeline"] != pipeline_fingerprint(model_path):
+        raise RuntimeError("Goldens were recorded with different tiny pipeline weights; re-run `record`.")
+    if (manifest["torch"], manifest["diffusers"]) != (torch.__version__, diffusers.__version__):
+        print(f"⚠️ Goldens were recorded with torch {manifest['torch']} / diffusers {manifest['diffusers']} "
+              f"(now {torch.__version__} / {diffusers.__version__}); small eager drift is expected.")
+    goldens = {}
+    for name in CASES:
+        with np.load(os.path.join(golden_dir, f"{name}.npz")) as data:
+            goldens[name] = (data["latents"], data["images"])
+    return goldens
+
+
+def compare(latents, images, golden_latents, golden_images):
+    """{"latent_rel", "image_max", "psnr"} drift of one case from its goldens."""
+    scale = max(float(np.abs(golden_latents).max()), 1e-8)
+    latent_rel = float(np.abs(latents.astype(np.float64) - golden_latents).max()) / scale
+    image_max, _, psnr = drift(images / 255.0, golden_images / 255.0)
+    return {"latent_rel": latent_rel, "image_max": image_max * 255, "psnr": psnr}
+
+
+def check(model_path, golden_dir, specs, runs):
+    """Prints the speed/drift table; returns True if every case is within tolerance."""
+    goldens = load_goldens(model_path, golden_dir)
+    # Eager always runs first: it is the speed baseline
+    profiles = [[]] + [modes for modes in map(parse_modes, specs) if modes]
+
+    all_passed = True
+    baseline = None
+    print(f"\n{'Profile':<20}{'Case':<15}{'Latency':>10}{'Speedup':>9}{'Latent Δ':>11}{'Pixel Δ':>9}{'PSNR':>8}  Status")
+    print("-" * 90)
+    for modes in profiles:
+        try:
+            results = run_profile(model_path, modes, runs)
+        except Exception as e:
+            print(f"{profile_name(modes):<20}{'':<15}  ❌ failed: {e}")
+            all_passed = False
+            continue
+        if not modes:
+            baseline = results
+        tol = tolerance(modes)
+        for name, (seconds, latents, images) in results.items():
+            d = compare(latents, images, *goldens[name])
+            passed = d["latent_rel"] <= tol["latent_rel"] and d["psnr"] >= tol["psnr"]
+            all_passed &= passed
+            speedup = baseline[name][0] / seconds if baseline else float("nan")
+            print(f"{profile_name(modes):<20}{name:<15}{seconds * 1000:>8.1f}ms{speedup:>8.2f}x"
+                  f"{d['latent_rel']:>11.2e}{d['image_max']:>9.1f}{d['psnr']:>8.1f}  "
+                  + ("✅" if passed else f"❌ (limits: latent {tol['latent_rel']:.0e}, PSNR {tol['psnr']:.0f} dB)"))
+
+        # Batched seeds must reproduce the single-image path for the same seed
+        grid = results["grid_batch2"][2]
+        single = results["single_cfg"][2][0]
+        if not np.array_equal(grid[0], single):
+            _, _, psnr = drift(grid[0] / 255.0, single / 255.0)
+            print(f"{'':<20}{'grid vs single':<15}  ⚠️ seed 0 differs when batched (PSNR {psnr:.1f} dB)")
+            all_passed &= psnr >= tol["psnr"]
+
+    print("\n" + ("✅ All cases within tolerance." if all_passed else "❌ Some cases are out of tolerance."))
+    return all_passed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["record", "check"])
+    parser.add_argument("--modes", nargs="+", default=DEFAULT_MODES,
+                        help="Profiles to check; combine with commas, e.g. int8,compile")
+    parser.add_argument("--runs", type=int, default=3, help="Timed runs per case (after one warm-up)")
+    parser.add_argument("--golden_dir", type=str, default=GOLDEN_DIR)
+    parser.add_argument("--model_path", type=str, default=None,
+                        help="Pipeline to use (default: tiny SD3 test pipeline)")
+    args = parser.parse_args()
+
+    model_path = args.model_path or ensure_tiny_pipeline()
+    if args.command == "record":
+        record(model_path, args.golden_dir, args.runs)
+    else:
+        sys.exit(0 if check(model_path, args.golden_dir, args.modes, args.runs) else 1)
+
+
+if __name__ == "__main__":
+    main()
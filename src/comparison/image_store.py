@@ -0,0 +1,122 @@
+"""
+Image Store
+Output backend for generated images.
+
+- Configurable format/compression (PNG level, lossy WebP, lossless WebP)
+- Encoding runs on a background thread pool so the next generation starts immediately
+- Downscaled JPEG thumbnails are written next to every image for fast dashboard display
+- Every file is written to a temp name and renamed, so pollers never read half-written files.
+  The JSON sidecar is written last and marks the output as complete.
+"""
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from PIL import Image
+load_dotenv()
+
+OUTPUT_FORMAT = os.getenv("OUTPUT_FORMAT", "png").lower()  # png | webp | webp_lossless
+PNG_COMPRESS_LEVEL = int(os.getenv("PNG_COMPRESS_LEVEL", "1"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", "90"))
+THUMBNAIL_SIZE = int(os.getenv("THUMBNAIL_SIZE", "384"))
+ENCODE_WORKERS = int(os.getenv("ENCODE_WORKERS", "2"))
+
+# format name -> (extension, PIL format)
+FORMATS = {
+    "png": (".png", "PNG"),
+    "webp": (".webp", "WEBP"),
+    "webp_lossless": (".webp", "WEBP"),
+}
+IMAGE_EXTENSIONS = (".png", ".webp")
+THUMBNAIL_SUFFIX = "_thumb.jpg"
+
+
+def save_params(fmt):
+    """PIL save() keyword arguments for an output format."""
+    if fmt == "png":
+        return {"compress_level": PNG_COMPRESS_LEVEL}
+    if fmt == "webp":
+        return {"quality": WEBP_QUALITY, "method": 4}
+    if fmt == "webp_lossless":
+        return {"lossless": True, "quality": 50, "method": 2}
+    raise ValueError(f"Unknown output format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+
+
+def output_extension(fmt=OUTPUT_FORMAT):
+    return FORMATS[fmt][0]
+
+
+def thumbnail_path(path):
+    return os.path.splitext(path)[0] + THUMBNAIL_SUFFIX
+
+
+def find_image(directory, basename):
+    """Return the path of `basename` in any supported image format, or None."""
+    for ext in IMAGE_EXTENSIONS:
+        path = os.path.join(directory, basename + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def atomic_save_image(image, path, pil_format, **params):
+    tmp_path = path + ".tmp"
+    image.save(tmp_path, format=pil_format, **params)
+    os.replace(tmp_path, path)
+
+
+def atomic_write_json(data, path):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ImageStore:
+    def __init__(self, fmt=OUTPUT_FORMAT, thumbnail_size=THUMBNAIL_SIZE, max_workers=ENCODE_WORKERS):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown output format '{fmt}'. Choose from: {', '.join(FORMATS)}")
+        self.fmt = fmt
+        self.extension, self.pil_format = FORMATS[fmt]
+        self.params = save_params(fmt)
+        self.thumbnail_size = thumbnail_size
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-store")
+
+    def resolve_path(self, path):
+        """Swap the extension of `path` for the one matching the configured format."""
+        return os.path.splitext(path)[0] + self.extension
+
+    def save(self, image, path, metadata=None, on_saved=None):
+        """
+        Queue `image` for encoding. Returns (final_path, future).
+        If `metadata` is given it is written as a JSON sidecar after the image and thumbnail.
+        `on_saved(path, metadata)` is called from the writer thread once everything is on disk.
+        """
+        path = self.resolve_path(path)
+        future = self.executor.submit(self._write, image, path, metadata, on_saved)
+        future.add_done_callback(self._report_error)
+        return path, future
+
+    @staticmethod
+    def _report_error(future):
+        if future.exception() is not None:
+            print(f"❌ Failed to write image: {future.exception()}")
+
+    def _write(self, image, path, metadata, on_saved=None):
+        atomic_save_image(image, path, self.pil_format, **self.params)
+
+        if self.thumbnail_size:
+            thumb = image.convert("RGB")
+            thumb.thumbnail((self.thumbnail_size, self.thumbnail_size), Image.BILINEAR)
+            atomic_save_image(thumb, thumbnail_path(path), "JPEG", quality=85)
+
+        if metadata is not None:
+            atomic_write_json(metadata, os.path.splitext(path)[0] + ".json")
+
+        if on_saved is not None:
+            on_saved(path, metadata)
+        return path
+
+    def close(self):
+        """Block until all queued images are on disk."""
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,111 @@
+"""
+Inference Modes
+Optional speed-ups for the SD3.5 transformer, mainly for CPU-only nodes.
+
+Modes (combine with commas, e.g. INFERENCE_MODE=int8,compile):
+- eager          fp32/fp16 eager execution (baseline)
+- int8           dynamic int8 quantization of all nn.Linear layers in the transformer (CPU only)
+- bf16           bf16 autocast around the pipeline call
+- compile        torch.compile on the transformer, with a persistent inductor cache in .cache/torch_compile
+- channels_last  channels-last memory format for the convolutional VAE
+
+SDPA_BACKEND additionally pins the scaled-dot-product-attention kernel (math | flash | efficient | cudnn).
+"""
+import os
+import contextlib
+import torch
+from dotenv import load_dotenv
+load_dotenv()
+
+INFERENCE_MODE = os.getenv("INFERENCE_MODE", "eager")
+SDPA_BACKEND = os.getenv("SDPA_BACKEND", "").lower()
+
+MODES = ("eager", "int8", "bf16", "compile", "channels_last")
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+COMPILE_CACHE_DIR = os.path.join(project_root, ".cache", "torch_compile")
+
+
+def parse_modes(spec):
+    """'int8, compile' -> ['int8', 'compile']. 'eager' alone means no modes."""
+    if isinstance(spec, (list, tuple)):
+        modes = [m.strip().lower() for m in spec]
+    else:
+        modes = [m.strip().lower() for m in (spec or "").split(",")]
+    modes = [m for m in modes if m and m != "eager"]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise ValueError(f"Unknown inference mode(s) {unknown}. Choose from: {', '.join(MODES)}")
+    return modes
+
+
+def profile_name(modes, sdpa_backend=SDPA_BACKEND):
+    """Short label for metadata/benchmarks, e.g. 'int8+compile' or 'eager'."""
+    name = "+".join(modes) if modes else "eager"
+    if sdpa_backend:
+        name += f"@sdpa-{sdpa_backend}"
+    return name
+
+
+def runner_device():
+    """Device SDRunner generates on."""
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def expected_profile(spec=INFERENCE_MODE, device="cpu"):
+    """Profile SDRunner records for `spec` on `device` (int8 is skipped off CPU, see apply_inference_modes)."""
+    return profile_name([m for m in parse_modes(spec) if m != "int8" or device == "cpu"])
+
+
+def enable_compile_cache(cache_dir=COMPILE_CACHE_DIR):
+    """Persist inductor/FX graph artifacts so compiles are reused across processes."""
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", cache_dir)
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+
+
+def apply_inference_modes(pipe, modes, device="cpu"):
+    """Apply weight/graph-level modes to a loaded pipeline in place. Returns the applied modes."""
+    applied = []
+    for mode in modes:
+        if mode == "int8":
+            if device != "cpu":
+                print("⚠️ int8 dynamic quantization is CPU only, skipping.")
+                continue
+            pipe.transformer = torch.ao.quantization.quantize_dynamic(
+                pipe.transformer, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        elif mode == "channels_last":
+            pipe.vae.to(memory_format=torch.channels_last)
+        elif mode == "compile":
+            enable_compile_cache()
+            pipe.transformer = torch.compile(pipe.transformer)
+        # bf16 is applied per call in inference_context()
+        applied.append(mode)
+    return applied
+
+
+def sdpa_context(backend=SDPA_BACKEND):
+    if not backend:
+        return contextlib.nullcontext()
+    from torch.nn.attention import SDPBackend, sdpa_kernel
+    backends = {
+        "math": SDPBackend.MATH,
+        "flash": SDPBackend.FLASH_ATTENTION,
+        "efficient": SDPBackend.EFFICIENT_ATTENTION,
+        "cudnn": SDPBackend.CUDNN_ATTENTION,
+    }
+    if backend not in backends:
+        raise ValueError(f"Unknown SDPA backend '{backend}'. Choose from: {', '.join(backends)}")
+    return sdpa_kernel(backends[backend])
+
+
+def inference_context(modes, device="cpu", sdpa_backend=SDPA_BACKEND):
+    """Context manager wrapping a pipeline call: bf16 autocast and SDPA backend selection."""
+    stack = contextlib.ExitStack()
+    if "bf16" in modes:
+        stack.enter_context(torch.autocast(device_type=device, dtype=torch.bfloat16))
+    stack.enter_context(sdpa_context(sdpa_backend))
+    return stack
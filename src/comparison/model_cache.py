@@ -0,0 +1,367 @@
+"""
+Model Cache Manager
+Indexes the Hugging Face cache in the project `.cache` directory (the same HF_HOME used by
+sd35_runner.py and generate_worker.py) so we can answer "can this task run offline?"
+instantly, before any worker is spawned, instead of failing late inside load_model().
+
+The index records, per model ID and revision, which pipeline components are present with
+file sizes and blob checksums. Checksums are verified in parallel on demand.
+
+    python src/comparison/model_cache.py index [--verify]
+    python src/comparison/model_cache.py check stabilityai/stable-diffusion-3.5-large
+    python src/comparison/model_cache.py dedupe
+
+Blobs in the hub cache are content-addressed (sha256 for LFS files, git sha1 otherwise), so
+identical files in different repos (e.g. the text encoders shared by Large and Large-Turbo)
+can be hard-linked to a single copy with `dedupe`.
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+load_dotenv()
+
+OFFLINE_MODE = os.getenv("OFFLINE", "False").lower() in ("true", "1", "yes")
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+CACHE_DIR = os.path.join(project_root, ".cache")
+INDEX_FILENAME = "artifact_index.json"
+
+SHA256_RE = re.compile(r"^[0-9a-f]{64}$")
+WEIGHT_EXTENSIONS = (".safetensors", ".bin", ".pt", ".ckpt")
+
+
+def hub_dir(cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, "hub")
+
+
+def repo_folder(model_id):
+    return "models--" + model_id.replace("/", "--")
+
+
+def folder_to_model_id(folder):
+    return folder[len("models--"):].replace("--", "/")
+
+
+def sha256_file(path, chunk_size=8 * 1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _scan_revision(snapshot_dir):
+    """{relative path: {size, mtime, blob}} for every file in a snapshot."""
+    files = {}
+    for root, _, names in os.walk(snapshot_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, snapshot_dir).replace(os.sep, "/")
+            try:
+                real = os.path.realpath(path)
+                stat = os.stat(real)
+            except OSError:
+                # Dangling symlink: blob was deleted or never finished downloading
+                files[rel] = {"size": None, "mtime": None, "blob": None, "status": "missing"}
+                continue
+            blob = os.path.basename(real) if os.path.islink(path) else None
+            files[rel] = {"size": stat.st_size, "mtime": stat.st_mtime, "blob": blob, "status": "ok"}
+    return files
+
+
+def _required_components(snapshot_dir):
+    """Component folders listed in model_index.json (skipping optional/None entries)."""
+    index_path = os.path.join(snapshot_dir, "model_index.json")
+    if not os.path.exists(index_path):
+        return []
+    with open(index_path) as f:
+        model_index = json.load(f)
+    return sorted(
+        name for name, value in model_index.items()
+        if not name.startswith("_") and isinstance(value, list) and value[0] is not None
+    )
+
+
+def _missing_shards(snapshot_dir, files):
+    """Shards referenced by *.index.json weight maps but absent from the snapshot."""
+    missing = []
+    for rel in files:
+        if not rel.endswith(".index.json"):
+            continue
+        with open(os.path.join(snapshot_dir, rel)) as f:
+            weight_map = json.load(f).get("weight_map", {})
+        folder = os.path.dirname(rel)
+        for shard in set(weight_map.values()):
+            shard_rel = f"{folder}/{shard}" if folder else shard
+            if files.get(shard_rel, {}).get("status") != "ok":
+                missing.append(shard_rel)
+    return sorted(missing)
+
+
+def _dir_mtimes(repo_dir):
+    """mtimes of a repo's refs/, snapshots/ and blobs/; any download or deleted blob changes one of them."""
+    mtimes = {}
+    for name in ("refs", "snapshots", "blobs"):
+        try:
+            mtimes[name] = os.stat(os.path.join(repo_dir, name)).st_mtime
+        except OSError:
+            mtimes[name] = None
+    return mtimes
+
+
+def _hub_mtime(cache_dir):
+    try:
+        return os.stat(hub_dir(cache_dir)).st_mtime
+    except OSError:
+        return None
+
+
+def is_stale(index, model_id=None):
+    """True if repos were added/removed, or `model_id`'s files changed, since `index` was built."""
+    cache_dir = index["cache_dir"]
+    if index.get("hub_mtime") != _hub_mtime(cache_dir):
+        return True
+    model = index["models"].get(model_id)
+    if model_id is None or model is None:
+        return False
+    return model.get("mtimes") != _dir_mtimes(os.path.join(hub_dir(cache_dir), repo_folder(model_id)))
+
+
+def build_index(cache_dir=CACHE_DIR, previous=None):
+    """Scan the hub cache. Checksums from `previous` are kept for files whose size/mtime are unchanged."""
+    previous = previous or {}
+    index = {"cache_dir": cache_dir, "hub_mtime": _hub_mtime(cache_dir), "models": {}}
+    root = hub_dir(cache_dir)
+    if not os.path.isdir(root):
+        return index
+
+    for folder in sorted(os.listdir(root)):
+        if not folder.startswith("models--"):
+            continue
+        model_id = folder_to_model_id(folder)
+        repo_dir = os.path.join(root, folder)
+        # Taken before scanning, so changes during the scan make the index stale
+        mtimes = _dir_mtimes(repo_dir)
+
+        refs = {}
+        refs_dir = os.path.join(repo_dir, "refs")
+        if os.path.isdir(refs_dir):
+            for ref in os.listdir(refs_dir):
+                with open(os.path.join(refs_dir, ref)) as f:
+                    refs[ref] = f.read().strip()
+
+        revisions = {}
+        snapshots_dir = os.path.join(repo_dir, "snapshots")
+        for revision in sorted(os.listdir(snapshots_dir)) if os.path.isdir(snapshots_dir) else []:
+            snapshot_dir = os.path.join(snapshots_dir, revision)
+            files = _scan_revision(snapshot_dir)
+
+            old_files = previous.get("models", {}).get(model_id, {}).get("revisions", {}).get(revision, {}).get("files", {})
+            for rel, info in files.items():
+                old = old_files.get(rel, {})
+                if old.get("size") == info["size"] and old.get("mtime") == info["mtime"]:
+                    info["sha256"] = old.get("sha256")
+                    info["status"] = old.get("status", info["status"])
+
+            components = {}
+            for rel, info in files.items():
+                component = rel.split("/")[0] if "/" in rel else "."
+                entry = components.setdefault(component, {"files": 0, "size": 0})
+                entry["files"] += 1
+                entry["size"] += info["size"] or 0
+
+            revisions[revision] = {
+                "required": _required_components(snapshot_dir),
+                "missing_shards": _missing_shards(snapshot_dir, files),
+                "components": components,
+                "files": files,
+            }
+
+        index["models"][model_id] = {"refs": refs, "mtimes": mtimes, "revisions": revisions}
+    return index
+
+
+def verify_index(index, workers=8):
+    """
+    Hash every file that has no checksum yet, in parallel. LFS blobs are named by their
+    sha256, so a mismatch marks the file as corrupt. Returns the list of corrupt files.
+    """
+    jobs = []
+    root = hub_dir(index["cache_dir"])
+    for model_id, model in index["models"].items():
+        for revision, rev in model["revisions"].items():
+            snapshot_dir = os.path.join(root, repo_folder(model_id), "snapshots", revision)
+            for rel, info in rev["files"].items():
+                if info["status"] == "ok" and not info.get("sha256"):
+                    jobs.append((model_id, rel, info, os.path.join(snapshot_dir, rel)))
+
+    # The same blob may be shared by several snapshots; hash it once
+    unique_paths = sorted({os.path.realpath(job[3]) for job in jobs})
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        digests = dict(zip(unique_paths, pool.map(sha256_file, unique_paths)))
+
+    corrupt = []
+    for model_id, rel, info, path in jobs:
+        info["sha256"] = digests[os.path.realpath(path)]
+        if info["blob"] and SHA256_RE.match(info["blob"]) and info["blob"] != info["sha256"]:
+            info["status"] = "corrupt"
+            corrupt.append(f"{model_id}/{rel}")
+    return corrupt
+
+
+def index_path(cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, INDEX_FILENAME)
+
+
+def load_index(cache_dir=CACHE_DIR):
+    path = index_path(cache_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_index(index, cache_dir=CACHE_DIR):
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = index_path(cache_dir) + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, index_path(cache_dir))
+
+
+def refresh_index(cache_dir=CACHE_DIR, verify=False, workers=8):
+    """Rescan (cheap, reuses known checksums), optionally verify, and save."""
+    index = build_index(cache_dir, previous=load_index(cache_dir))
+    if verify:
+        verify_index(index, workers)
+    save_index(index, cache_dir)
+    return index
+
+
+def check_offline(model_id, revision="main", index=None, cache_dir=CACHE_DIR):
+    """
+    Returns (ok, problems) for running `model_id` without network access.
+    Uses `index` if given. Otherwise the saved index is used, rescanned once (cheap, no hashing)
+    if it is stale or reports a problem; without a saved index the cache is scanned.
+    """
+    if index is not None:
+        return _check_index(index, model_id, revision)
+
+    saved = load_index(cache_dir)
+    if saved is not None and not is_stale(saved, model_id):
+        ok, problems = _check_index(saved, model_id, revision)
+        if ok:
+            return ok, problems
+    # Missing, stale or failing: the cache may have changed since `index` was run
+    return _check_index(refresh_index(cache_dir), model_id, revision)
+
+
+def _check_index(index, model_id, revision="main"):
+    model = index["models"].get(model_id)
+    if model is None:
+        return False, [f"{model_id} is not in the cache"]
+
+    commit = model["refs"].get(revision, revision)
+    rev = model["revisions"].get(commit)
+    if rev is None:
+        return False, [f"{model_id}: no snapshot for revision '{revision}'"]
+
+    problems = []
+    if "model_index.json" not in rev["files"]:
+        problems.append(f"{model_id}: model_index.json missing")
+    for component in rev["required"]:
+        files = [rel for rel in rev["files"] if rel.startswith(component + "/")]
+        if not files:
+            problems.append(f"{model_id}: component '{component}' missing")
+        elif component in ("transformer", "vae", "text_encoder", "text_encoder_2", "text_encoder_3") \
+                and not any(rel.endswith(WEIGHT_EXTENSIONS) for rel in files):
+            problems.append(f"{model_id}: no weights for '{component}'")
+    problems += [f"{model_id}: shard missing: {shard}" for shard in rev["missing_shards"]]
+    problems += [
+        f"{model_id}: {rel} is {info['status']}"
+        for rel, info in rev["files"].items() if info["status"] != "ok"
+    ]
+    return not problems, problems
+
+
+def dedupe_blobs(cache_dir=CACHE_DIR, dry_run=False):
+    """Hard-link identical blobs across repos to one copy. Returns bytes saved."""
+    root = hub_dir(cache_dir)
+    seen = {}
+    saved = 0
+    for folder in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        blobs_dir = os.path.join(root, folder, "blobs")
+        if not os.path.isdir(blobs_dir):
+            continue
+        for blob in sorted(os.listdir(blobs_dir)):
+            path = os.path.join(blobs_dir, blob)
+            if blob.endswith(".incomplete") or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            key = (blob, stat.st_size)
+            if key not in seen:
+                seen[key] = path
+                continue
+            original = seen[key]
+            if os.path.samefile(original, path):
+                continue
+            saved += stat.st_size
+            if not dry_run:
+                tmp_path = path + ".dedupe"
+                os.link(original, tmp_path)
+                os.replace(tmp_path, path)
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache_dir", type=str, default=CACHE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_index = sub.add_parser("index", help="Scan the cache and save the index")
+    p_index.add_argument("--verify", action="store_true", help="Compute and check checksums")
+    p_index.add_argument("--workers", type=int, default=8)
+
+    p_check = sub.add_parser("check", help="Check whether models can run offline")
+    p_check.add_argument("model_ids", nargs="+")
+
+    p_dedupe = sub.add_parser("dedupe", help="Hard-link identical blobs across models")
+    p_dedupe.add_argument("--dry_run", action="store_true")
+
+    args = parser.parse_args()
+
+    if args.command == "index":
+        index = refresh_index(args.cache_dir, verify=args.verify, workers=args.workers)
+        for model_id, model in index["models"].items():
+            for revision, rev in model["revisions"].items():
+                size = sum(c["size"] for c in rev["components"].values())
+                bad = sum(1 for f in rev["files"].values() if f["status"] != "ok")
+                print(f"{model_id}@{revision[:10]}: {len(rev['files'])} files, {size / 1e9:.2f} GB"
+                      + (f", ❌ {bad} bad" if bad else ""))
+        print(f"Saved index to {index_path(args.cache_dir)}")
+
+    elif args.command == "check":
+        all_ok = True
+        for model_id in args.model_ids:
+            ok, problems = check_offline(model_id, cache_dir=args.cache_dir)
+            all_ok &= ok
+            print(f"{'✅' if ok else '❌'} {model_id}")
+            for problem in problems:
+                print(f"   {problem}")
+        sys.exit(0 if all_ok else 1)
+
+    elif args.command == "dedupe":
+        saved = dedupe_blobs(args.cache_dir, dry_run=args.dry_run)
+        print(f"{'Would save' if args.dry_run else 'Saved'} {saved / 1e9:.2f} GB")
+        if not args.dry_run:
+            refresh_index(args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
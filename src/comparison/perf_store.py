@@ -0,0 +1,300 @@
+"""
+Generation Performance Store
+Columnar history of every generation (model, settings, duration, phase timings, memory,
+device, inference profile) for the Performance Analytics section of the dashboard.
+
+Layout (out/analytics/):
+    pending.jsonl       new records, appended one line per generation (cheap, multi-process safe)
+    runs/part-*.parquet compacted records; small parts are merged once there are too many
+    aggregates.parquet  per (model, steps, guidance, profile, device): runs, mean, p50/p90/p99,
+                        throughput and recent-vs-baseline p50 change (regression check)
+    daily.parquet       per (model, day): images, p50 and throughput over time
+
+Writers call append() per image and compact() at the end of a run; aggregates are
+recomputed on compaction, so the dashboard only reads two small tables.
+Records are keyed by the output path, so backfilling old JSON sidecars is idempotent.
+
+    python src/comparison/perf_store.py backfill      # import out/comparison/*/*.json
+    python src/comparison/perf_store.py summary
+"""
+import os
+import glob
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import pandas as pd
+from image_store import find_image
+from inference_modes import profile_name
+
+ANALYTICS_DIR = os.path.join("out", "analytics")
+COMPARISON_ROOT = os.path.join("out", "comparison")
+GROUP_KEYS = ["model", "steps", "guidance", "profile", "device"]
+PHASES = ["load", "encode", "denoise", "decode"]
+MAX_PARTS = 16
+RECENT_RUNS = 20        # runs compared against the older baseline
+MIN_BASELINE_RUNS = 5
+REGRESSION_THRESHOLD = 0.10   # recent p50 >10% slower than baseline
+
+COLUMNS = {
+    "record_id": "string", "timestamp": "float64", "source": "string", "run_id": "string",
+    "model": "string", "model_id": "string", "steps": "Int64", "guidance": "float64", "seed": "Int64",
+    "duration": "float64", "load": "float64", "encode": "float64", "denoise": "float64", "decode": "float64",
+    "peak_memory_mb": "float64", "device": "string", "profile": "string", "path": "string",
+}
+
+
+def record_id(path=None):
+    return hashlib.sha1(os.path.abspath(path).encode()).hexdigest() if path else uuid.uuid4().hex
+
+
+def make_record(metadata, source, device=None, profile=None, run_id=None, path=None, timestamp=None):
+    """
+    Flatten generation metadata (model, steps, guidance, duration, timings, ...) into a store row.
+    Records without a profile (e.g. old sidecars) get the runner's default one ("eager").
+    """
+    timings = metadata.get("timings") or {}
+    record = {
+        "record_id": record_id(path),
+        "timestamp": timestamp or time.time(),
+        "source": source,
+        "run_id": run_id,
+        "model": metadata.get("model"),
+        "model_id": metadata.get("model_id"),
+        "steps": metadata.get("steps"),
+        "guidance": metadata.get("guidance"),
+        "seed": metadata.get("seed"),
+        "duration": metadata.get("duration"),
+        "peak_memory_mb": timings.get("peak_memory_mb"),
+        "device": device or metadata.get("device"),
+        "profile": profile or metadata.get("profile") or profile_name([]),
+        "path": path,
+    }
+    record.update({phase: timings.get(phase) for phase in PHASES})
+    return record
+
+
+def seed_records(metadata, source, device=None, profile=None, run_id=None, timestamp=None):
+    """
+    One record per image of a seed grid (metadata with "per_seed", see SDRunner.generate_grid),
+    so percentiles stay per image. Phase timings are split evenly; the batch size joins the profile.
+    """
+    n = len(metadata["per_seed"])
+    timings = {k: v / n if k in ("encode", "denoise", "decode") and v is not None else v
+               for k, v in (metadata.get("timings") or {}).items() if k not in ("load", "total")}
+    profile = profile or metadata.get("profile") or profile_name([])
+    return [
+        make_record({**metadata, "duration": entry["duration"], "seed": entry["seed"], "timings": timings},
+                    source, device, f"{profile}+batch{entry['batch_size']}", run_id, entry.get("path"), timestamp)
+        for entry in metadata["per_seed"]
+    ]
+
+
+def _frame(records):
+    df = pd.DataFrame(records, columns=list(COLUMNS))
+    return df.astype(COLUMNS)
+
+
+class PerfStore:
+    def __init__(self, root=ANALYTICS_DIR):
+        self.root = root
+        self.runs_dir = os.path.join(root, "runs")
+        self.pending_path = os.path.join(root, "pending.jsonl")
+        self.aggregates_path = os.path.join(root, "aggregates.parquet")
+        self.daily_path = os.path.join(root, "daily.parquet")
+        os.makedirs(self.runs_dir, exist_ok=True)
+
+    # === WRITE ===
+
+    def append(self, record):
+        with open(self.pending_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    def compact(self):
+        """Move pending records into a Parquet part, merge small parts and refresh aggregates."""
+        # Claim the pending log atomically so concurrent writers start a new one
+        claimed = os.path.join(self.root, f"compacting-{os.getpid()}-{time.time_ns()}.jsonl")
+        try:
+            os.rename(self.pending_path, claimed)
+        except FileNotFoundError:
+            claimed = None
+
+        if claimed:
+            records = _read_jsonl(claimed)
+            if records:
+                _frame(records).to_parquet(self._new_part_path(), index=False)
+            os.remove(claimed)
+
+        parts = self._parts()
+        if len(parts) > MAX_PARTS:
+            merged = self.load()
+            merged.to_parquet(self._new_part_path(), index=False)
+            for part in parts:
+                os.remove(part)
+
+        self.refresh_aggregates()
+
+    def backfill(self, output_root=COMPARISON_ROOT):
+        """Import JSON sidecars of past dashboard runs (records already in the store are skipped)."""
+        known = set(self.load(columns=["record_id"])["record_id"])
+        added = 0
+        for meta_path in sorted(glob.glob(os.path.join(output_root, "*", "*.json"))):
+            run_id = os.path.basename(os.path.dirname(meta_path))
+            try:
+                with open(meta_path) as f:
+                    metadata = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                continue
+            if "duration" not in metadata:
+                continue
+            image_path = find_image(os.path.dirname(meta_path), os.path.splitext(os.path.basename(meta_path))[0])
+            if image_path is None or record_id(image_path) in known:
+                continue
+            try:
+                timestamp = time.mktime(time.strptime(run_id, "%Y%m%d-%H%M%S"))
+            except ValueError:
+                timestamp = os.path.getmtime(meta_path)
+            if "per_seed" in metadata:
+                records = [r for r in seed_records(metadata, "backfill", run_id=run_id, timestamp=timestamp)
+                           if r["record_id"] not in known]
+            else:
+                records = [make_record(metadata, "backfill", run_id=run_id, path=image_path, timestamp=timestamp)]
+            for record in records:
+                self.append(record)
+            added += len(records)
+        self.compact()
+        return added
+
+    # === READ ===
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self.runs_dir, "part-*.parquet")))
+
+    def _new_part_path(self):
+        return os.path.join(self.runs_dir, f"part-{time.time_ns()}-{os.getpid()}.parquet")
+
+    def load(self, columns=None):
+        """All records (compacted + pending), de-duplicated by record_id."""
+        frames = [pd.read_parquet(p, columns=columns) for p in self._parts()]
+        pending = [r for p in glob.glob(os.path.join(self.root, "*.jsonl")) for r in _read_jsonl(p)]
+        if pending:
+            frames.append(_frame(pending)[columns] if columns else _frame(pending))
+        if not frames:
+            return _frame([])[columns] if columns else _frame([])
+        df = pd.concat(frames, ignore_index=True)
+        if "record_id" in df.columns:
+            df = df.drop_duplicates("record_id", keep="last")
+        return df
+
+    def refresh_aggregates(self):
+        df = self.load()
+        # Write-then-rename so the dashboard never reads a half-written table
+        for table, path in ((compute_aggregates(df), self.aggregates_path), (compute_daily(df), self.daily_path)):
+            table.to_parquet(path + ".tmp", index=False)
+            os.replace(path + ".tmp", path)
+
+    def aggregates(self):
+        return pd.read_parquet(self.aggregates_path) if os.path.exists(self.aggregates_path) else None
+
+    def daily(self):
+        return pd.read_parquet(self.daily_path) if os.path.exists(self.daily_path) else None
+
+    def version(self):
+        """Changes whenever the aggregates are rewritten (cache key for the dashboard)."""
+        return os.path.getmtime(self.aggregates_path) if os.path.exists(self.aggregates_path) else 0.0
+
+
+def _read_jsonl(path):
+    records = []
+    try:
+        with open(path) as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # partially written line
+    except FileNotFoundError:
+        pass
+    return records
+
+
+# === AGGREGATES ===
+
+def _clean(df):
+    """Rows with a duration; missing labels become "unknown" so they still form groups."""
+    df = df.dropna(subset=["duration", "steps", "guidance"])
+    return df.fillna({"model": "unknown", "profile": "unknown", "device": "unknown"})
+
+
+def compute_aggregates(df):
+    """Latency percentiles, throughput and regression check per model/setting."""
+    df = _clean(df).sort_values("timestamp")
+    if df.empty:
+        return pd.DataFrame(columns=GROUP_KEYS + ["runs", "mean", "p50", "p90", "p99"])
+
+    grouped = df.groupby(GROUP_KEYS)
+    agg = grouped["duration"].agg(runs="size", mean="mean")
+    quantiles = grouped["duration"].quantile([0.5, 0.9, 0.99]).unstack()
+    quantiles.columns = ["p50", "p90", "p99"]
+    phases = grouped[PHASES + ["peak_memory_mb"]].median().add_suffix("_p50")
+    agg = agg.join(quantiles).join(phases)
+    agg["img_per_min"] = 60.0 / agg["mean"]
+    agg["last_run"] = grouped["timestamp"].max()
+
+    def regression(durations):
+        recent, baseline = durations.iloc[-RECENT_RUNS:], durations.iloc[:-RECENT_RUNS]
+        if len(baseline) < MIN_BASELINE_RUNS:
+            # Not enough history: compare the newer half against the older half
+            half = len(durations) // 2
+            if half < MIN_BASELINE_RUNS:
+                return pd.Series({"baseline_p50": float("nan"), "recent_p50": float("nan")})
+            recent, baseline = durations.iloc[half:], durations.iloc[:half]
+        return pd.Series({"baseline_p50": baseline.median(), "recent_p50": recent.median()})
+
+    agg = agg.join(grouped["duration"].apply(regression).unstack())
+    agg["change"] = agg["recent_p50"] / agg["baseline_p50"] - 1
+    agg["regressed"] = agg["change"] > REGRESSION_THRESHOLD
+    return agg.reset_index()
+
+
+def compute_daily(df):
+    """Images, median latency and throughput per model and day."""
+    df = _clean(df)
+    if df.empty:
+        return pd.DataFrame(columns=["model", "day", "images", "p50", "busy_s", "img_per_min"])
+    df = df.assign(day=pd.to_datetime(df["timestamp"], unit="s").dt.floor("D"))
+    daily = df.groupby(["model", "day"]).agg(
+        images=("duration", "size"), p50=("duration", "median"), busy_s=("duration", "sum")
+    )
+    daily["img_per_min"] = daily["images"] / daily["busy_s"] * 60
+    return daily.reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_backfill = sub.add_parser("backfill", help="Import JSON sidecars from past dashboard runs")
+    p_backfill.add_argument("--output_root", type=str, default=COMPARISON_ROOT)
+    sub.add_parser("compact", help="Compact pending records and refresh aggregates")
+    sub.add_parser("summary", help="Print per model/setting latency aggregates")
+    parser.add_argument("--root", type=str, default=ANALYTICS_DIR)
+    args = parser.parse_args()
+
+    store = PerfStore(args.root)
+    if args.command == "backfill":
+        print(f"Imported {store.backfill(args.output_root):,} records into {store.root}")
+    elif args.command == "compact":
+        store.compact()
+        print(f"Compacted {store.root}")
+    else:
+        agg = store.aggregates()
+        if agg is None or agg.empty:
+            print("No records yet.")
+            return
+        pd.set_option("display.width", 200)
+        print(agg[GROUP_KEYS + ["runs", "p50", "p90", "p99", "img_per_min", "change", "regressed"]].to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
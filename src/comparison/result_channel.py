@@ -0,0 +1,109 @@
+"""
+Result Channel
+Hands generated images from run_batch.py to the dashboard through shared memory,
+so results are displayed straight from the generating process instead of waiting for
+the PNG to be encoded, written, polled and decoded again. Disk persistence still happens
+in the background (see image_store.py) and remains the fallback.
+
+One shared-memory segment per output path. Layout:
+    header (magic, state, height, width, channels, metadata length)
+    metadata (UTF-8 JSON)
+    pixels (raw RGB, uint8, row-major)
+The writer sets state READY only after everything else is written; the reader sets
+CONSUMED once it has copied the data, after which the writer may unlink the segment.
+"""
+import os
+import json
+import time
+import struct
+import hashlib
+import numpy as np
+from multiprocessing import shared_memory
+from PIL import Image
+
+MAGIC = b"SDRC"
+HEADER = struct.Struct("<4sB3xIIII")  # magic, state, height, width, channels, meta_len
+STATE_WRITING, STATE_READY, STATE_CONSUMED = 0, 1, 2
+STATE_OFFSET = 4
+
+
+def channel_name(path):
+    """Segment name for an output path; independent of the image extension."""
+    key = os.path.splitext(os.path.abspath(path))[0]
+    return "sd35_" + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _attach(name):
+    """Attach to an existing segment without letting this process' resource tracker unlink it."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if os.name != "nt":
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+class ResultPublisher:
+    """Writer side, owned by the generating process."""
+
+    def __init__(self):
+        self.segments = []
+
+    def publish(self, path, image, metadata):
+        pixels = np.asarray(image.convert("RGB"))
+        meta = json.dumps(metadata).encode()
+        height, width, channels = pixels.shape
+        size = HEADER.size + len(meta) + pixels.nbytes
+
+        try:
+            shm = shared_memory.SharedMemory(name=channel_name(path), create=True, size=size)
+        except FileExistsError:
+            # Stale segment from a crashed run with the same output path
+            stale = _attach(channel_name(path))
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=channel_name(path), create=True, size=size)
+
+        HEADER.pack_into(shm.buf, 0, MAGIC, STATE_WRITING, height, width, channels, len(meta))
+        offset = HEADER.size
+        shm.buf[offset:offset + len(meta)] = meta
+        offset += len(meta)
+        np.ndarray(pixels.shape, dtype=np.uint8, buffer=shm.buf, offset=offset)[:] = pixels
+        shm.buf[STATE_OFFSET] = STATE_READY
+        self.segments.append(shm)
+
+    def close(self, timeout=10.0):
+        """Unlink all segments, giving readers up to `timeout` seconds to consume them."""
+        deadline = time.time() + timeout
+        while time.time() < deadline and any(shm.buf[STATE_OFFSET] != STATE_CONSUMED for shm in self.segments):
+            time.sleep(0.2)
+        for shm in self.segments:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self.segments = []
+
+
+def read_result(path):
+    """Reader side. Returns (PIL image, metadata dict) if a result for `path` is ready, else None."""
+    try:
+        shm = _attach(channel_name(path))
+    except FileNotFoundError:
+        return None
+
+    try:
+        magic, state, height, width, channels, meta_len = HEADER.unpack_from(shm.buf, 0)
+        if magic != MAGIC or state != STATE_READY:
+            return None
+        offset = HEADER.size
+        metadata = json.loads(bytes(shm.buf[offset:offset + meta_len]))
+        offset += meta_len
+        pixels = np.ndarray((height, width, channels), dtype=np.uint8, buffer=shm.buf, offset=offset).copy()
+        shm.buf[STATE_OFFSET] = STATE_CONSUMED
+        return Image.fromarray(pixels), metadata
+    finally:
+        shm.close()
@@ -5,10 +5,18 @@ import time
 import json
 from sd35_runner import SDRunner
 from constants import HF_TOKEN
+from result_channel import ResultPublisher
+from model_cache import OFFLINE_MODE, check_offline
+from perf_store import PerfStore, make_record, seed_records
+from task_scheduler import plan_tasks, print_plan, format_seconds
+from cpu_config import (
+    apply_cpu_config, TORCH_THREADS, TORCH_INTEROP_THREADS, CPU_CORES, NUMA_NODE
+)
 
-def run_batch(prompt, tasks_json):
+def run_batch(prompt, tasks_json, cpu_config=None):
     """
     Runs generation for multiple models sequentially with per-task settings.
+    Tasks are reordered first to minimise model loads (see task_scheduler.py).
     tasks_json: JSON string list of dicts:
     [
       {
@@ -16,23 +24,55 @@ def run_batch(prompt, tasks_json):
         "id": "...", 
         "path": "...",
         "steps": 28,
-        "guidance": 7.0
+        "guidance": 7.0,
+        "preview_path": "...",  (optional)
+        "seeds": [0, 1, 2, 3],  (optional; 2+ seeds -> one image per seed, tiled into a grid at "path")
+        "prompt": "...",        (optional; defaults to `prompt`)
+        "priority": 0           (optional; higher runs first)
       },
       ...
     ]
+    cpu_config: optional kwargs for cpu_config.apply_cpu_config (threads, cores, NUMA node)
     """
     print("\n" + "="*60)
     print("  STABLE DIFFUSION 3.5 COMPARISON - BATCH EXECUTION")
     print("="*60 + "\n")
-    print(f"Prompt: {prompt}")
+    if prompt:
+        print(f"Prompt: {prompt}")
     print("-" * 60)
 
     try:
-        # Initialize Runner
-        runner = SDRunner(auth_token=HF_TOKEN)
-        
+        # Threads / pinning must be configured before the pipeline is loaded
+        if cpu_config is not None:
+            applied = apply_cpu_config(**cpu_config)
+            print(f"CPU: {applied['threads']} threads on cores {applied['cores']}"
+                  + (f" (NUMA node {applied['numa_node']})" if applied['numa_node'] is not None else ""))
+
         # Parse tasks
         tasks = json.loads(tasks_json)
+
+        # Fail fast if a model is not fully cached, instead of inside load_model()
+        if OFFLINE_MODE:
+            problems = [p for model_id in dict.fromkeys(t['id'] for t in tasks) for p in check_offline(model_id)[1]]
+            if problems:
+                raise RuntimeError("Offline mode, but the cache is incomplete:\n  " + "\n  ".join(problems))
+
+        if any(not task.get('prompt', prompt) for task in tasks):
+            raise ValueError("Every task needs a prompt (task \"prompt\" or --prompt)")
+
+        # Initialize Runner
+        runner = SDRunner(auth_token=HF_TOKEN)
+        # Results go to the dashboard through shared memory; disk writes happen in the background
+        publisher = ResultPublisher()
+        # Generation history for the dashboard's Performance Analytics
+        perf_store = PerfStore()
+
+        # Group by model (one load per model and priority level) and estimate from past runs
+        plan = plan_tasks(tasks, perf_store.aggregates(), runner.current_model_id, runner.device, runner.profile)
+        print_plan(plan)
+        print("-" * 60)
+        tasks = plan['tasks']
+        batch_start = time.time()
         
         for i, task in enumerate(tasks):
             name = task['name']
@@ -40,39 +80,68 @@ def run_batch(prompt, tasks_json):
             path = task['path']
             steps = task.get('steps', 28)
             guidance = task.get('guidance', 7.0)
+            preview_path = task.get('preview_path')
+            seeds = task.get('seeds') or []
+            task_prompt = task.get('prompt', prompt)
             
             print(f"\n[{i+1}/{len(tasks)}] Generating with {name}...")
             print(f"Model: {model_id}")
-            print(f"Settings: Steps={steps}, Guidance={guidance}")
+            if task_prompt != prompt:
+                print(f"Prompt: {task_prompt}")
+            print(f"Settings: Steps={steps}, Guidance={guidance}"
+                  + (f", Seeds={seeds}" if len(seeds) > 1 else ""))
             
             try:
-                # Optimized for memory: The runner handles unloading/loading
-                image, duration, _ = runner.generate(
-                    prompt, 
-                    model_id, 
-                    steps=steps, 
-                    guidance_scale=guidance,
-                    output_path=path
-                )
-                print(f"✅ Success! Saved to: {path}")
-                print(f"⏱️ Duration: {duration:.2f}s")
-                
-                # Write metadata sidecar within the same directory, same basename
-                # e.g. image.png -> image.json
-                meta_path = os.path.splitext(path)[0] + ".json"
-                
+                # Metadata sidecar within the same directory, same basename
+                # e.g. image.png -> image.json. Written by the image store after the image,
+                # so its presence marks the output as complete.
                 metadata = {
                     "model": name,
                      # We can also save the model_id if we want
-                    "duration": duration,
                     "steps": steps,
                     "guidance": guidance,
-                    "prompt": prompt
+                    "prompt": task_prompt
                 }
-                with open(meta_path, "w") as f:
-                    json.dump(metadata, f, indent=2)
 
-                
+                run_id = os.path.basename(os.path.dirname(path))
+                if len(seeds) > 1:
+                    # Seed grid: prompt encoded once, seeds denoised in memory-sized batches
+                    image, _, per_seed, duration, saved_path = runner.generate_grid(
+                        task_prompt,
+                        model_id,
+                        seeds,
+                        steps=steps,
+                        guidance_scale=guidance,
+                        output_path=path,
+                        preview_path=preview_path,
+                        metadata=metadata
+                    )
+                    for record in seed_records(
+                        {**metadata, "model_id": model_id, "timings": runner.last_timings, "per_seed": per_seed},
+                        "dashboard", runner.device, runner.profile, run_id=run_id
+                    ):
+                        perf_store.append(record)
+                else:
+                    # Optimized for memory: The runner handles unloading/loading
+                    image, duration, saved_path = runner.generate(
+                        task_prompt, 
+                        model_id, 
+                        steps=steps, 
+                        guidance_scale=guidance,
+                        output_path=path,
+                        preview_path=preview_path,
+                        metadata=metadata,
+                        seed=seeds[0] if seeds else None
+                    )
+                    perf_store.append(make_record(
+                        {**metadata, "model_id": model_id, "duration": duration, "timings": runner.last_timings},
+                        "dashboard", runner.device, runner.profile,
+                        run_id=run_id, path=saved_path
+                    ))
+                publisher.publish(path, image, {**metadata, "duration": duration})
+                print(f"✅ Success! Saving to: {saved_path}")
+                print(f"⏱️ Duration: {duration:.2f}s")
+
             except Exception as e:
                 print(f"❌ Error generating {name}: {e}")
                 import traceback
@@ -80,7 +149,15 @@ def run_batch(prompt, tasks_json):
                 
             print("-" * 60)
             
-        print("\n✨ All tasks completed.")
+        # Flush background image writes before reporting completion
+        runner.close()
+        publisher.close()
+        try:
+            perf_store.compact()
+        except Exception as e:
+            print(f"⚠️ Could not update the performance store: {e}")
+        print(f"\n✨ All tasks completed in {format_seconds(time.time() - batch_start)}"
+              + (f" (estimated {format_seconds(plan['estimate'])})." if plan['estimate'] is not None else "."))
         
     except Exception as ie:
          print(f"CRITICAL ERROR IN BATCH RUNNER: {ie}")
@@ -93,12 +170,28 @@ def run_batch(prompt, tasks_json):
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--prompt", type=str, required=True)
-    parser.add_argument("--tasks", type=str, required=True, help="JSON string of tasks config")
+    parser.add_argument("--prompt", type=str, default=None, help="Default prompt for tasks without one")
+    parser.add_argument("--tasks", type=str, default=None, help="JSON string of tasks config")
+    parser.add_argument("--tasks_file", type=str, default=None, help="JSON file of tasks config (instead of --tasks)")
+    parser.add_argument("--threads", type=int, default=TORCH_THREADS, help="Intra-op threads (0 = torch default)")
+    parser.add_argument("--interop-threads", type=int, default=TORCH_INTEROP_THREADS)
+    parser.add_argument("--cores", type=str, default=CPU_CORES, help="Cores to pin to, e.g. 0-15")
+    parser.add_argument("--numa-node", type=str, default=NUMA_NODE, help="Pin to a NUMA node and bind memory")
     
     args = parser.parse_args()
+    if (args.tasks is None) == (args.tasks_file is None):
+        parser.error("Give exactly one of --tasks / --tasks_file")
+    if args.tasks_file:
+        with open(args.tasks_file) as f:
+            args.tasks = f.read()
     
     run_batch(
         args.prompt,
-        args.tasks
+        args.tasks,
+        cpu_config={
+            "threads": args.threads,
+            "interop_threads": args.interop_threads,
+            "cores": args.cores,
+            "numa_node": args.numa_node,
+        }
     )
@@ -25,19 +25,117 @@ else:
     print(f"Hugging Face Cache: {cache_dir}")
     print("🌍 Mode: ONLINE (Will check Hugging Face for updates)")
 
+import math
 import torch
 import time
 import gc
+from PIL import Image
 from diffusers import StableDiffusion3Pipeline
+from latent_preview import LatentPreviewer, PREVIEW_EVERY
+from image_store import ImageStore
+from inference_modes import (
+    INFERENCE_MODE, parse_modes, profile_name, apply_inference_modes, inference_context, runner_device
+)
+
+class StepTimer:
+    """
+    Step-end callback that timestamps denoising steps (optionally chaining another callback).
+    Prompt encoding and VAE decoding run before the first / after the last step, so
+    phase times are derived from the first and last step timestamps.
+    Keeps a reference to the latest latents (the final latents once the call returns).
+    """
+
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.step_ends = []
+        self.latents = None
+
+    def __call__(self, pipe, step, timestep, callback_kwargs):
+        self.step_ends.append(time.perf_counter())
+        if self.callback is not None:
+            callback_kwargs = self.callback(pipe, step, timestep, callback_kwargs)
+        self.latents = callback_kwargs.get("latents")
+        return callback_kwargs
+
+    def phases(self, start, end):
+        """{"encode", "denoise", "decode"} seconds for a pipeline call running from start to end."""
+        if not self.step_ends:
+            return {"encode": None, "denoise": None, "decode": None}
+        first, last = self.step_ends[0], self.step_ends[-1]
+        # First step duration is estimated from the average of the following steps
+        step = (last - first) / (len(self.step_ends) - 1) if len(self.step_ends) > 1 else first - start
+        return {
+            "encode": max(first - start - step, 0.0),
+            "denoise": last - first + step,
+            "decode": end - last,
+        }
+
+
+def peak_memory_mb(device):
+    """
+    Peak allocated CUDA memory since the last reset. None on CPU: the process's peak RSS
+    covers its whole lifetime, so it would repeat the largest earlier run, not this one.
+    """
+    if device == "cuda":
+        return torch.cuda.max_memory_allocated() / 2**20
+    return None
+
+
+# Seed grids: starting estimate of extra memory per image in a batch, refined from measurements (CUDA)
+GRID_MB_PER_IMAGE = float(os.getenv("GRID_MB_PER_IMAGE", "2048"))
+GRID_MEMORY_FRACTION = float(os.getenv("GRID_MEMORY_FRACTION", "0.8"))
+
+
+def free_memory_mb(device):
+    """Free GPU memory, or MemAvailable on Linux CPUs (None if unknown)."""
+    if device == "cuda":
+        return torch.cuda.mem_get_info()[0] / 2**20
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return None
+
+
+def is_out_of_memory(error):
+    if isinstance(error, torch.cuda.OutOfMemoryError):
+        return True
+    message = str(error).lower()
+    return "out of memory" in message or "can't allocate memory" in message
+
+
+def make_grid(images, cols=None):
+    """Tile equally sized PIL images into a grid (row-major, `cols` defaults to ~sqrt(n))."""
+    cols = cols or math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / cols)
+    w, h = images[0].size
+    grid = Image.new("RGB", (cols * w, rows * h), "white")
+    for i, img in enumerate(images):
+        grid.paste(img, ((i % cols) * w, (i // cols) * h))
+    return grid
+
 
 class SDRunner:
-    def __init__(self, output_dir="out/comparison", auth_token=None):
+    def __init__(self, output_dir="out/comparison", auth_token=None, inference_modes=INFERENCE_MODE):
         self.output_dir = output_dir
         self.auth_token = auth_token
         os.makedirs(self.output_dir, exist_ok=True)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = runner_device()
         self.current_model_id = None
         self.pipeline = None
+        self.store = ImageStore()
+        # Optional int8/bf16/compile/channels_last modes (see inference_modes.py)
+        self.inference_modes = parse_modes(inference_modes)
+        self.profile = profile_name(self.inference_modes)
+        # Phase timings of the last generate() call (see StepTimer)
+        self.last_timings = {}
+        self.last_load_time = 0.0
+        # Final (pre-VAE) latents of the last generate()/generate_grid() call, on CPU
+        self.last_latents = None
+        self.mb_per_image = GRID_MB_PER_IMAGE
 
         if not OFFLINE_MODE and self.auth_token:
             try:
@@ -49,6 +147,7 @@ class SDRunner:
                 print("Continuing, but model downloads might fail if repositories are gated.")
 
     def load_model(self, model_id):
+        self.last_load_time = 0.0
         if self.current_model_id == model_id:
             return
 
@@ -81,40 +180,210 @@ class SDRunner:
                 print("Enabled CPU Offload.")
             else:
                 self.pipeline.to(self.device)
+
+            if self.inference_modes:
+                self.inference_modes = apply_inference_modes(self.pipeline, self.inference_modes, self.device)
+                self.profile = profile_name(self.inference_modes)
+                print(f"Inference profile: {self.profile}")
                 
             self.current_model_id = model_id
+            self.last_load_time = time.time() - t0
         except OSError:
             if OFFLINE_MODE:
                 print(f"\n❌ ERROR: Model '{model_id}' not found in cache.", file=sys.stderr)
                 print(f"   Path checked: {cache_dir}", file=sys.stderr)
-                print("   Set OFFLINE=False in .env to download it.\n", file=sys.stderr)
+                print("   Set OFFLINE=False in .env to download it.", file=sys.stderr)
+                print("   Run `python src/comparison/model_cache.py check <model_id>` for details.\n", file=sys.stderr)
             raise
         except Exception as e:
             print(f"Error loading model {model_id}: {e}")
             raise e
 
-    def generate(self, prompt, model_id, steps=28, guidance_scale=7.0, output_path=None):
+    def generate(self, prompt, model_id, steps=28, guidance_scale=7.0, output_path=None,
+                 preview_path=None, preview_every=PREVIEW_EVERY, metadata=None, seed=None,
+                 on_saved=None):
+        """
+        Generates one image. Encoding/saving happens in the background (see ImageStore);
+        if `metadata` is given it is written as a JSON sidecar once the image is on disk,
+        with the measured "duration" and phase "timings" added. `on_saved(path, metadata)` is
+        called after the write. `seed` makes the initial latents reproducible.
+        """
         self.load_model(model_id)
+
+        # Optional live previews: cheap linear latent->RGB projection every N steps
+        previewer = LatentPreviewer(preview_path, every=preview_every) if preview_path else None
+        try:
+            timer = StepTimer(previewer)
         
-        start_time = time.time()
-        image = self.pipeline(
-            prompt, 
-            num_inference_steps=steps, 
-            guidance_scale=guidance_scale
-        ).images[0]
-        end_time = time.time()
+            generator = torch.Generator("cpu").manual_seed(seed) if seed is not None else None
+            if self.device == "cuda":
+                torch.cuda.reset_peak_memory_stats()
         
-        generation_time = end_time - start_time
+            start_time = time.time()
+            perf_start = time.perf_counter()
+            with inference_context(self.inference_modes, self.device):
+                image = self.pipeline(
+                    prompt, 
+                    num_inference_steps=steps, 
+                    guidance_scale=guidance_scale,
+                    generator=generator,
+                    callback_on_step_end=timer,
+                    callback_on_step_end_tensor_inputs=["latents"],
+                ).images[0]
+            end_time = time.time()
         
-        # Save image
-        if output_path:
-            filepath = output_path
-        else:
-            timestamp = time.strftime("%Y%m%d-%H%M%S")
-            model_name = model_id.split("/")[-1]
-            filename = f"{timestamp}_{model_name}.png"
-            filepath = os.path.join(self.output_dir, filename)
-            
-        image.save(filepath)
+            generation_time = end_time - start_time
+            self.last_timings = {
+                "load": self.last_load_time,
+                **timer.phases(perf_start, time.perf_counter()),
+                "total": generation_time,
+                "peak_memory_mb": peak_memory_mb(self.device),
+            }
+            self.last_latents = timer.latents.detach().float().cpu() if timer.latents is not None else None
         
-        return image, generation_time, filepath
+            # Save image (encoded in the background)
+            if output_path:
+                filepath = output_path
+            else:
+                timestamp = time.strftime("%Y%m%d-%H%M%S")
+                model_name = model_id.split("/")[-1]
+                filename = f"{timestamp}_{model_name}{self.store.extension}"
+                filepath = os.path.join(self.output_dir, filename)
+
+            if metadata is not None:
+                metadata = {**metadata, "duration": generation_time, "timings": self.last_timings}
+            filepath, _ = self.store.save(image, filepath, metadata, on_saved)
+
+            return image, generation_time, filepath
+        finally:
+            if previewer:
+                previewer.cleanup()
+
+    def auto_batch_size(self, num_seeds):
+        """Largest batch that should fit in currently free memory (at least 1, at most num_seeds)."""
+        free = free_memory_mb(self.device)
+        if free is None:
+            # Unknown free memory (no /proc/meminfo): one image at a time rather than risk OOM
+            return 1
+        return max(1, min(num_seeds, int(free * GRID_MEMORY_FRACTION / self.mb_per_image)))
+
+    def generate_grid(self, prompt, model_id, seeds, steps=28, guidance_scale=7.0, output_path=None,
+                      preview_path=None, preview_every=PREVIEW_EVERY, metadata=None, batch_size=None,
+                      on_saved=None):
+        """
+        Generates one image per seed and tiles them into a grid.
+        The prompt is encoded once; seeded latents are denoised in batches. Without `batch_size`
+        the batch size follows free memory and is halved whenever a batch runs out of memory.
+        Seed i gives the same starting latents as generate(seed=i).
+        Saves the grid to `output_path` (sidecar with per-seed metadata) and each seed as
+        "<name>_seed<seed><ext>". Returns (grid, images, per_seed, duration, grid_path).
+        """
+        seeds = list(seeds)
+        self.load_model(model_id)
+        pipe = self.pipeline
+        device = pipe._execution_device
+        do_cfg = guidance_scale > 1
+
+        if self.device == "cuda":
+            torch.cuda.reset_peak_memory_stats()
+        start_time = time.time()
+
+        # Text encoders run once for all seeds
+        t0 = time.perf_counter()
+        with torch.no_grad(), inference_context(self.inference_modes, self.device):
+            prompt_embeds, negative_embeds, pooled, negative_pooled = pipe.encode_prompt(
+                prompt=prompt, prompt_2=None, prompt_3=None, device=device,
+                num_images_per_prompt=1, do_classifier_free_guidance=do_cfg,
+            )
+        encode_time = time.perf_counter() - t0
+
+        previewer = LatentPreviewer(preview_path, every=preview_every) if preview_path else None
+        try:
+            adaptive = batch_size is None
+            batch_size = batch_size or self.auto_batch_size(len(seeds))
+            images, per_seed, latents = [], [], []
+            phases = {"encode": encode_time, "denoise": 0.0, "decode": 0.0}
+            pos = 0
+            while pos < len(seeds):
+                batch = seeds[pos:pos + batch_size]
+                n = len(batch)
+                timer = StepTimer(previewer)
+                base_memory = torch.cuda.memory_allocated() if self.device == "cuda" else 0
+                if self.device == "cuda":
+                    torch.cuda.reset_peak_memory_stats()
+                batch_start = time.perf_counter()
+                try:
+                    with inference_context(self.inference_modes, self.device):
+                        result = pipe(
+                            prompt_embeds=prompt_embeds.repeat(n, 1, 1),
+                            negative_prompt_embeds=negative_embeds.repeat(n, 1, 1) if do_cfg else None,
+                            pooled_prompt_embeds=pooled.repeat(n, 1),
+                            negative_pooled_prompt_embeds=negative_pooled.repeat(n, 1) if do_cfg else None,
+                            num_inference_steps=steps,
+                            guidance_scale=guidance_scale,
+                            generator=[torch.Generator("cpu").manual_seed(s) for s in batch],
+                            callback_on_step_end=timer,
+                            callback_on_step_end_tensor_inputs=["latents"],
+                        )
+                except Exception as e:
+                    if not is_out_of_memory(e) or batch_size == 1:
+                        raise
+                    gc.collect()
+                    if self.device == "cuda":
+                        torch.cuda.empty_cache()
+                    batch_size = max(1, batch_size // 2)
+                    # Start later grids smaller, too
+                    self.mb_per_image *= 2
+                    print(f"⚠️ Out of memory with {n} images per batch, retrying with {batch_size}")
+                    continue
+                batch_end = time.perf_counter()
+
+                batch_phases = timer.phases(batch_start, batch_end)
+                phases["denoise"] += batch_phases["denoise"] or 0.0
+                phases["decode"] += batch_phases["decode"] or 0.0
+                if self.device == "cuda":
+                    # Learn the real per-image cost for the next batch
+                    measured = (torch.cuda.max_memory_allocated() - base_memory) / 2**20 / n
+                    if measured > 0:
+                        self.mb_per_image = measured
+                if timer.latents is not None:
+                    latents.append(timer.latents.detach().float().cpu())
+                for seed, image in zip(batch, result.images):
+                    images.append(image)
+                    per_seed.append({"seed": seed, "batch_size": n, "duration": (batch_end - batch_start) / n})
+                pos += n
+                if adaptive and pos < len(seeds):
+                    batch_size = self.auto_batch_size(len(seeds) - pos)
+
+            generation_time = time.time() - start_time
+            self.last_timings = {
+                "load": self.last_load_time,
+                **phases,
+                "total": generation_time,
+                "peak_memory_mb": peak_memory_mb(self.device),
+            }
+            self.last_latents = torch.cat(latents) if latents else None
+
+            if output_path:
+                filepath = output_path
+            else:
+                timestamp = time.strftime("%Y%m%d-%H%M%S")
+                filepath = os.path.join(self.output_dir, f"{timestamp}_{model_id.split('/')[-1]}_grid{self.store.extension}")
+            base, ext = os.path.splitext(filepath)
+            for entry, image in zip(per_seed, images):
+                entry["path"], _ = self.store.save(image, f"{base}_seed{entry['seed']}{ext}")
+
+            grid = make_grid(images)
+            if metadata is not None:
+                metadata = {**metadata, "duration": generation_time, "timings": self.last_timings,
+                            "seeds": seeds, "per_seed": per_seed}
+            filepath, _ = self.store.save(grid, filepath, metadata, on_saved)
+
+            return grid, images, per_seed, generation_time, filepath
+        finally:
+            if previewer:
+                previewer.cleanup()
+
+    def close(self):
+        """Waits for pending image writes."""
+        self.store.close()
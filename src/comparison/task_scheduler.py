@@ -0,0 +1,188 @@
+"""
+Task Scheduler
+Reorders queued generation tasks before run_batch executes them. SDRunner keeps a single
+pipeline in memory, so every change of model between consecutive tasks is a full unload/reload.
+
+- Tasks run in priority order (task "priority", higher first, default 0); never reordered across levels.
+- Within a level, tasks are grouped by model. The model that is already loaded goes first, and a
+  model that is also queued in the next level goes last, so it stays loaded across the boundary.
+- Within a model, tasks with the same settings (steps, guidance) are kept together; they can
+  share one pipeline batch even with different prompts.
+- Order is otherwise stable (first appearance), so an already grouped queue is left unchanged.
+
+Wall time is estimated from the performance store aggregates (see perf_store.py): per-step
+denoise time and encode/decode overhead per model, plus one model load per swap.
+
+    plan = plan_tasks(tasks, PerfStore().aggregates(), device="cpu", profile="eager")
+    print_plan(plan)
+    for task in plan["tasks"]: ...
+
+    python src/comparison/task_scheduler.py tasks.json
+"""
+import json
+import argparse
+import pandas as pd
+from perf_store import PerfStore
+
+
+def batch_key(task):
+    """Tasks of one model with equal keys could run in a single pipeline call."""
+    return (task.get("steps", 28), task.get("guidance", 7.0))
+
+
+def count_swaps(tasks, loaded_model=None):
+    swaps = 0
+    for task in tasks:
+        if task["id"] != loaded_model:
+            swaps += 1
+            loaded_model = task["id"]
+    return swaps
+
+
+def _group(items, key):
+    """{key: [items]} in order of first appearance."""
+    groups = {}
+    for item in items:
+        groups.setdefault(key(item), []).append(item)
+    return groups
+
+
+def order_tasks(tasks, loaded_model=None):
+    """Tasks grouped by model (and batch key) within each priority level, higher priority first."""
+    levels = _group(tasks, lambda t: t.get("priority", 0))
+    priorities = sorted(levels, reverse=True)
+    ordered = []
+    for i, priority in enumerate(priorities):
+        by_model = _group(levels[priority], lambda t: t["id"])
+        models = list(by_model)
+        next_models = {t["id"] for t in levels[priorities[i + 1]]} if i + 1 < len(priorities) else set()
+        # Hand over a model that the next level needs too (unless it is the only one left)
+        carry = next((m for m in reversed(models) if m in next_models and m != loaded_model), None)
+        if carry is not None and len(models) > 1:
+            models.remove(carry)
+            models.append(carry)
+        if loaded_model in by_model:
+            models.remove(loaded_model)
+            models.insert(0, loaded_model)
+
+        for model in models:
+            for batch in _group(by_model[model], batch_key).values():
+                ordered.extend(batch)
+        loaded_model = ordered[-1]["id"]
+    return ordered
+
+
+class TimeEstimator:
+    """Per-image and model-load estimates from perf_store aggregates (one row per model/setting)."""
+
+    def __init__(self, aggregates=None, device=None, profile=None):
+        df = aggregates if aggregates is not None else pd.DataFrame()
+        if not df.empty:
+            # Prefer measurements from the same device/profile; fall back to everything recorded
+            for column, value in (("device", device), ("profile", profile)):
+                if value is not None and (df[column] == value).any():
+                    df = df[df[column] == value]
+            df = df[df["steps"] > 0]
+        self.df = df
+
+    def _rows(self, model):
+        return self.df if self.df.empty else self.df[self.df["model"] == model]
+
+    def image(self, model, steps):
+        """Seconds for one image of `model` at `steps` (None without any recorded runs)."""
+        rows = self._rows(model)
+        if rows.empty:
+            return None
+        phased = rows.dropna(subset=["denoise_p50"])
+        if not phased.empty:
+            per_step = (phased["denoise_p50"] / phased["steps"]).median()
+            overhead = (phased["encode_p50"].fillna(0) + phased["decode_p50"].fillna(0)).median()
+            return overhead + per_step * steps
+        # Runs imported from old sidecars only have the total duration
+        return (rows["p50"] / rows["steps"]).median() * steps
+
+    def load(self, model):
+        """Seconds to load `model` (runs that reused a loaded model record a load time of 0)."""
+        rows = self._rows(model)
+        if rows.empty:
+            return None
+        loads = rows["load_p50"].dropna()
+        loads = loads[loads > 0]
+        return loads.max() if not loads.empty else None
+
+
+def plan_tasks(tasks, aggregates=None, loaded_model=None, device=None, profile=None):
+    """
+    Reordered tasks plus estimates:
+    {"tasks", "estimates" (seconds per task, load included, None if unknown),
+     "swaps", "swaps_unplanned", "estimate" (total seconds), "unknown" (models without history)}
+    """
+    ordered = order_tasks(tasks, loaded_model)
+    estimator = TimeEstimator(aggregates, device, profile)
+    estimates, unknown = [], []
+    current = loaded_model
+    for task in ordered:
+        images = max(1, len(task.get("seeds") or []))
+        seconds = estimator.image(task["name"], task.get("steps", 28))
+        if seconds is not None:
+            seconds *= images
+            if task["id"] != current:
+                load = estimator.load(task["name"])
+                seconds = seconds + load if load is not None else seconds
+        elif task["name"] not in unknown:
+            unknown.append(task["name"])
+        current = task["id"]
+        estimates.append(seconds)
+
+    known = [s for s in estimates if s is not None]
+    return {
+        "tasks": ordered,
+        "estimates": estimates,
+        "swaps": count_swaps(ordered, loaded_model),
+        "swaps_unplanned": count_swaps(tasks, loaded_model),
+        "estimate": sum(known) if known else None,
+        "unknown": unknown,
+    }
+
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "?"
+    minutes, secs = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s" if minutes else f"{secs}s"
+
+
+def print_plan(plan):
+    print(f"📋 Plan: {len(plan['tasks'])} tasks, {plan['swaps']} model loads "
+          f"(in queue order: {plan['swaps_unplanned']})")
+    elapsed = 0.0
+    for i, (task, seconds) in enumerate(zip(plan["tasks"], plan["estimates"])):
+        elapsed += seconds or 0.0
+        seeds = len(task.get("seeds") or [])
+        priority = f"[p{task.get('priority', 0)}]"
+        print(f"  {i + 1:>3}. {priority:<5} {task['name']:<14} "
+              f"steps={task.get('steps', 28):<3} guidance={task.get('guidance', 7.0):<5}"
+              + (f" seeds={seeds:<3}" if seeds > 1 else "")
+              + (f" ~{format_seconds(seconds):>6}  (done at ~{format_seconds(elapsed)})" if seconds is not None else " ~?"))
+    if plan["estimate"] is not None:
+        print(f"⏱️ Estimated wall time: {format_seconds(plan['estimate'])}"
+              + (" (no history yet for: " + ", ".join(plan["unknown"]) + ")" if plan["unknown"] else ""))
+    else:
+        print("⏱️ No recorded runs yet; wall time unknown (see Performance Analytics)")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("tasks_file", type=str, help="JSON list of tasks (run_batch.py format)")
+    parser.add_argument("--device", type=str, default=None)
+    parser.add_argument("--profile", type=str, default=None)
+    args = parser.parse_args()
+
+    with open(args.tasks_file) as f:
+        tasks = json.load(f)
+    print_plan(plan_tasks(tasks, PerfStore().aggregates(), device=args.device, profile=args.profile))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Tiny SD3 Pipeline
+Builds a randomly initialised StableDiffusion3Pipeline with the real SD3 architecture
+(MMDiT transformer, 2x CLIP + T5 text encoders, VAE, flow-matching scheduler) but only a few
+thousand parameters. Used for benchmarks and regression checks on CPU, without network
+access or model downloads.
+
+The pipeline is saved to `.cache/tiny-sd3` so it can be loaded by path like any hub model:
+    SDRunner().generate(prompt, ensure_tiny_pipeline())
+"""
+import os
+import json
+import tempfile
+import torch
+from diffusers import (
+    AutoencoderKL,
+    FlowMatchEulerDiscreteScheduler,
+    SD3Transformer2DModel,
+    StableDiffusion3Pipeline,
+)
+from tokenizers import Regex, Tokenizer, models, pre_tokenizers
+from transformers import (
+    CLIPTextConfig,
+    CLIPTextModelWithProjection,
+    CLIPTokenizer,
+    T5Config,
+    T5EncoderModel,
+    T5TokenizerFast,
+)
+from transformers.models.clip.tokenization_clip import bytes_to_unicode
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+TINY_PIPELINE_DIR = os.path.join(project_root, ".cache", "tiny-sd3")
+
+
+def build_tokenizer(directory):
+    """Character-level CLIP tokenizer written from scratch (no hub download)."""
+    chars = list(bytes_to_unicode().values())
+    tokens = chars + [c + "</w>" for c in chars] + ["<|startoftext|>", "<|endoftext|>"]
+    vocab_path = os.path.join(directory, "vocab.json")
+    merges_path = os.path.join(directory, "merges.txt")
+    with open(vocab_path, "w", encoding="utf-8") as f:
+        json.dump({tok: i for i, tok in enumerate(tokens)}, f)
+    with open(merges_path, "w", encoding="utf-8") as f:
+        f.write("#version: 0.2\n")
+    return CLIPTokenizer(vocab_path, merges_path, model_max_length=77)
+
+
+def build_t5_tokenizer():
+    """Character-level T5 tokenizer (no sentencepiece model or hub download needed)."""
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for i in range(32, 127):
+        vocab.setdefault(chr(i), len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Split(Regex("."), behavior="isolated")
+    return T5TokenizerFast(
+        tokenizer_object=tokenizer, pad_token="<pad>", eos_token="</s>", unk_token="<unk>",
+        extra_ids=0, model_max_length=77,
+    )
+
+
+def build_tiny_pipeline(seed=0):
+    """Create the tiny pipeline in memory. Same seed -> same weights."""
+    torch.manual_seed(seed)
+    transformer = SD3Transformer2DModel(
+        sample_size=32,
+        patch_size=1,
+        in_channels=4,
+        num_layers=1,
+        attention_head_dim=8,
+        num_attention_heads=4,
+        caption_projection_dim=32,
+        joint_attention_dim=32,
+        pooled_projection_dim=64,
+        out_channels=4,
+    )
+
+    clip_config = CLIPTextConfig(
+        bos_token_id=0,
+        eos_token_id=2,
+        hidden_size=32,
+        intermediate_size=37,
+        layer_norm_eps=1e-05,
+        num_attention_heads=4,
+        num_hidden_layers=5,
+        pad_token_id=1,
+        vocab_size=1000,
+        hidden_act="gelu",
+        projection_dim=32,
+    )
+    torch.manual_seed(seed)
+    text_encoder = CLIPTextModelWithProjection(clip_config)
+    torch.manual_seed(seed + 1)
+    text_encoder_2 = CLIPTextModelWithProjection(clip_config)
+
+    torch.manual_seed(seed)
+    text_encoder_3 = T5EncoderModel(T5Config(
+        vocab_size=1000,
+        d_model=32,
+        d_kv=8,
+        d_ff=37,
+        num_layers=1,
+        num_heads=4,
+    ))
+
+    torch.manual_seed(seed)
+    vae = AutoencoderKL(
+        sample_size=32,
+        in_channels=3,
+        out_channels=3,
+        block_out_channels=(4,),
+        layers_per_block=1,
+        latent_channels=4,
+        norm_num_groups=1,
+        use_quant_conv=False,
+        use_post_quant_conv=False,
+        shift_factor=0.0609,
+        scaling_factor=1.5035,
+    )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tokenizer = build_tokenizer(tmp)
+
+    # All seven components are present, so from_pretrained() can load it by path
+    return StableDiffusion3Pipeline(
+        transformer=transformer,
+        scheduler=FlowMatchEulerDiscreteScheduler(),
+        vae=vae,
+        text_encoder=text_encoder,
+        tokenizer=tokenizer,
+        text_encoder_2=text_encoder_2,
+        tokenizer_2=tokenizer,
+        text_encoder_3=text_encoder_3,
+        tokenizer_3=build_t5_tokenizer(),
+    )
+
+
+def ensure_tiny_pipeline(path=TINY_PIPELINE_DIR, seed=0):
+    """Save the tiny pipeline to `path` (once) and return the path, usable as a model_id."""
+    # Older copies were saved without T5 and cannot be loaded by from_pretrained()
+    if not os.path.exists(os.path.join(path, "text_encoder_3")):
+        build_tiny_pipeline(seed).save_pretrained(path)
+        print(f"Saved tiny SD3 pipeline to {path}")
+    return path
+
+
+if __name__ == "__main__":
+    ensure_tiny_pipeline()
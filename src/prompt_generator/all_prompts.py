@@ -4,7 +4,9 @@ import itertools
 from collections import Counter
 
 import matplotlib.pyplot as plt
-from prompt_generator import BUCKETS, ATTR_TO_TEXT
+from prompt_generator import BUCKETS
+from celeba_attrs import load_attributes, attribute_sets
+from prompt_templates import DEFAULT_TEMPLATE
 
 # Paths
 CSV_PATH = "../../res/list_attr_celeba.csv"
@@ -12,56 +14,18 @@ OUTPUT_CSV = "celeba_prompt_stats.csv"
 OUTPUT_IMG = "prompt_matches_distribution.png"
 
 
-def load_attribute_sets():
+def load_attribute_sets(csv_path=CSV_PATH):
     """
     Loads CelebA CSV and converts columns into Sets of Image IDs.
     This allows for O(1) intersection speed when checking combinations.
     """
-    print(f"Loading dataset from {CSV_PATH}...")
+    print(f"Loading dataset from {csv_path}...")
 
-    attr_sets = {}
-    all_attr_names = []
+    # Skip blurry
+    ids, all_attr_names, matrix = load_attributes(csv_path, exclude_blurry=True)
+    attr_sets = attribute_sets(ids, all_attr_names, matrix)
 
-    with open(CSV_PATH, 'r') as f:
-        reader = csv.reader(f)
-
-        # Handle headers
-        first_line = next(reader)
-        if len(first_line) == 1 and first_line[0].isdigit():
-            headers = next(reader)
-        else:
-            headers = first_line
-
-        headers = [h.strip() for h in headers]
-        if len(headers) == 1 and ' ' in headers[0]:
-            headers = headers[0].split()
-
-        attr_start_idx = 1
-        all_attr_names = headers[attr_start_idx:]
-
-        for name in all_attr_names:
-            attr_sets[name] = set()
-
-        blurry_idx = headers.index('Blurry') if 'Blurry' in headers else -1
-
-        count = 0
-        for line in reader:
-            parts = line[0].split() if len(line) == 1 and ' ' in line[0] else line
-
-            # Skip blurry
-            if blurry_idx != -1 and int(parts[blurry_idx]) == 1:
-                continue
-
-            img_id = parts[0]
-
-            # Map attributes (1 = True)
-            for i, val in enumerate(parts[attr_start_idx:]):
-                if int(val) == 1:
-                    attr_name = all_attr_names[i]
-                    attr_sets[attr_name].add(img_id)
-            count += 1
-
-    print(f"Processed {count:,} images.")
+    print(f"Processed {len(ids):,} images.")
     return attr_sets, all_attr_names
 
 
@@ -148,14 +112,12 @@ def generate_stats():
 
     # === SAVE TO CSV ===
     print(f"Saving to {OUTPUT_CSV}...")
+    prompts = DEFAULT_TEMPLATE.render_batch([r['gender'] for r in results], [r['attrs'] for r in results])
     with open(OUTPUT_CSV, 'w', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(["Gender", "Count", "Attribute_1", "Attribute_2", "Attribute_3", "Buckets", "Prompt_Preview"])
 
-        for r in results:
-            text_attrs = [ATTR_TO_TEXT.get(a, a) for a in r['attrs']]
-            prompt = f"A realistic portrait of a {r['gender']}, with {text_attrs[0]}, {text_attrs[1]}, and {text_attrs[2]}."
-
+        for r, prompt in zip(results, prompts):
             writer.writerow([
                 r['gender'],
                 r['count'],
@@ -0,0 +1,137 @@
+"""
+Benchmark: celeba_attrs reader vs. the previous per-cell loaders
+Writes a synthetic 200k x 40 attribute file in both layouts (original whitespace .txt and
+Kaggle .csv) and times the previous dashboard / all_prompts loaders (copied below)
+against celeba_attrs.load_attributes and iter_attribute_chunks.
+
+    python src/prompt_generator/benchmark_attr_reader.py --rows 200000
+"""
+import os
+import csv
+import time
+import argparse
+import tempfile
+import numpy as np
+
+from celeba_attrs import load_attributes, attribute_sets, iter_attribute_chunks
+
+ATTR_NAMES = [
+    "5_o_Clock_Shadow", "Arched_Eyebrows", "Attractive", "Bags_Under_Eyes", "Bald", "Bangs", "Big_Lips",
+    "Big_Nose", "Black_Hair", "Blond_Hair", "Blurry", "Brown_Hair", "Bushy_Eyebrows", "Chubby",
+    "Double_Chin", "Eyeglasses", "Goatee", "Gray_Hair", "Heavy_Makeup", "High_Cheekbones", "Male",
+    "Mouth_Slightly_Open", "Mustache", "Narrow_Eyes", "No_Beard", "Oval_Face", "Pale_Skin", "Pointy_Nose",
+    "Receding_Hairline", "Rosy_Cheeks", "Sideburns", "Smiling", "Straight_Hair", "Wavy_Hair",
+    "Wearing_Earrings", "Wearing_Hat", "Wearing_Lipstick", "Wearing_Necklace", "Wearing_Necktie", "Young",
+]
+
+
+def write_synthetic(directory, rows, seed=0):
+    """Same random -1/1 matrix in both layouts. Returns (txt_path, csv_path, matrix)."""
+    rng = np.random.default_rng(seed)
+    values = np.where(rng.random((rows, len(ATTR_NAMES))) < 0.3, 1, -1)
+    ids = [f"{i + 1:06d}.jpg" for i in range(rows)]
+
+    txt_path = os.path.join(directory, "list_attr_celeba.txt")
+    with open(txt_path, "w") as f:
+        f.write(f"{rows}\n" + " ".join(ATTR_NAMES) + "\n")
+        for img_id, row in zip(ids, values):
+            f.write(img_id + " " + " ".join(f"{v:2d}" for v in row) + "\n")
+
+    csv_path = os.path.join(directory, "list_attr_celeba.csv")
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["image_id"] + ATTR_NAMES)
+        for img_id, row in zip(ids, values):
+            writer.writerow([img_id] + row.tolist())
+    return txt_path, csv_path, (values > 0).astype(np.int8)
+
+
+# === PREVIOUS LOADERS (for comparison) ===
+
+def legacy_load_dataset(csv_path):
+    """prompt_dashboard.load_dataset before celeba_attrs."""
+    rows = []
+    with open(csv_path, 'r') as f:
+        reader = csv.reader(f)
+        first_line = next(reader)
+        attr_names = next(reader) if len(first_line) == 1 and first_line[0].isdigit() else first_line
+        attr_names = [h.strip() for h in attr_names]
+        if len(attr_names) == 1 and ' ' in attr_names[0]:
+            attr_names = attr_names[0].split()
+        id_col = attr_names[0]
+        attr_names = attr_names[1:] if 'image' in id_col.lower() or len(attr_names) == 41 else attr_names
+        blurry_idx = attr_names.index('Blurry') if 'Blurry' in attr_names else -1
+        for line in reader:
+            parts = line[0].split() if len(line) == 1 and ' ' in line[0] else line
+            attrs = [1 if int(val) == 1 else 0 for val in parts[1:]]
+            if len(attrs) == len(attr_names):
+                if blurry_idx >= 0 and attrs[blurry_idx] == 1:
+                    continue
+                rows.append({"image_id": parts[0], "attrs": attrs})
+    return attr_names, rows
+
+
+def legacy_load_attribute_sets(csv_path):
+    """all_prompts.load_attribute_sets before celeba_attrs."""
+    with open(csv_path, 'r') as f:
+        reader = csv.reader(f)
+        first_line = next(reader)
+        headers = next(reader) if len(first_line) == 1 and first_line[0].isdigit() else first_line
+        headers = [h.strip() for h in headers]
+        if len(headers) == 1 and ' ' in headers[0]:
+            headers = headers[0].split()
+        all_attr_names = headers[1:]
+        attr_sets = {name: set() for name in all_attr_names}
+        blurry_idx = headers.index('Blurry') if 'Blurry' in headers else -1
+        for line in reader:
+            parts = line[0].split() if len(line) == 1 and ' ' in line[0] else line
+            if blurry_idx != -1 and int(parts[blurry_idx]) == 1:
+                continue
+            for i, val in enumerate(parts[1:]):
+                if int(val) == 1:
+                    attr_sets[all_attr_names[i]].add(parts[0])
+    return attr_sets, all_attr_names
+
+
+def timed(label, func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<40} {best * 1000:9.1f} ms")
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        txt_path, csv_path, expected = write_synthetic(tmp, args.rows)
+        blurry = ATTR_NAMES.index("Blurry")
+        expected_kept = expected[expected[:, blurry] == 0]
+
+        for label, path in (("whitespace .txt", txt_path), ("comma .csv", csv_path)):
+            print(f"\n{args.rows:,} x {len(ATTR_NAMES)} ({label})")
+            (ids, names, matrix), t_new = timed("celeba_attrs.load_attributes", lambda: load_attributes(path, exclude_blurry=True), args.repeat)
+            _, t_chunks = timed("celeba_attrs.iter_attribute_chunks", lambda: sum(len(c) for _, c in iter_attribute_chunks(path)), args.repeat)
+            (_, rows), t_dash = timed("legacy prompt_dashboard.load_dataset", lambda: legacy_load_dataset(path), args.repeat)
+            sets, t_sets_new = timed("celeba_attrs -> attribute_sets", lambda: attribute_sets(*load_attributes(path, exclude_blurry=True)), args.repeat)
+            assert names == ATTR_NAMES and np.array_equal(matrix, expected_kept)
+            assert np.array_equal(matrix, np.array([r["attrs"] for r in rows], dtype=np.int8))
+            print(f"  speedup: load {t_dash / t_new:.1f}x")
+            try:
+                (legacy_sets, _), t_sets = timed("legacy all_prompts.load_attribute_sets", lambda: legacy_load_attribute_sets(path), args.repeat)
+            except IndexError:
+                # Its header handling assumed an image_id column (Kaggle .csv only)
+                print("  legacy all_prompts.load_attribute_sets: fails on this layout")
+                continue
+            assert sets == legacy_sets
+            print(f"  speedup: attribute sets {t_sets / t_sets_new:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
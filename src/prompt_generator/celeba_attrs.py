@@ -0,0 +1,90 @@
+"""
+CelebA Attribute Reader
+One reader for list_attr_celeba in any of its common layouts:
+    - original .txt: count line, 40 attribute names, then "000001.jpg -1 1 ..." (whitespace separated)
+    - Kaggle .csv:   "image_id,5_o_Clock_Shadow,...", then "000001.jpg,-1,1,..."
+The layout is detected once from the first two lines; parsing is done by pandas' C parser
+directly into an int8 0/1 matrix (-1/1 and 0/1 values both work), in chunks.
+
+    ids, attr_names, matrix = load_attributes(CSV_PATH)
+    for ids, matrix in iter_attribute_chunks(CSV_PATH, chunksize=50000): ...
+
+Benchmark against the previous per-cell Python loaders:
+    python src/prompt_generator/benchmark_attr_reader.py
+"""
+import os
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+CSV_PATH = os.path.join(project_root, "res", "list_attr_celeba.csv")
+CHUNK_SIZE = 65536
+
+
+def detect_format(path):
+    """{"sep", "skiprows", "attr_names"} from the first two lines of the file."""
+    with open(path, "r") as f:
+        first = f.readline().strip()
+        second = f.readline().strip()
+
+    skiprows = 1
+    header = first
+    if first.isdigit():
+        # Original format: image count, then the header line
+        header, skiprows = second, 2
+
+    sep = "," if "," in header else r"\s+"
+    names = [h.strip() for h in (header.split(",") if sep == "," else header.split())]
+    # The first column holds the image ID; the .txt header omits its name
+    attr_names = names[1:] if len(names) == 41 or "image" in names[0].lower() else names
+    return {"sep": sep, "skiprows": skiprows, "attr_names": attr_names}
+
+
+def iter_attribute_chunks(path=CSV_PATH, chunksize=CHUNK_SIZE, fmt=None):
+    """Yields (image_ids, int8 (n, 40) matrix of 0/1) per chunk of rows."""
+    fmt = fmt or detect_format(path)
+    attr_names = fmt["attr_names"]
+    reader = pd.read_csv(
+        path, sep=fmt["sep"], skiprows=fmt["skiprows"], header=None,
+        names=["image_id"] + attr_names, index_col=False,
+        dtype={"image_id": str},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        # int64 -1/1 (or 0/1) -> int8 0/1; cheaper than asking the parser for int8 columns
+        values = chunk[attr_names].to_numpy()
+        yield chunk["image_id"].to_numpy(), (values > 0).view(np.int8)
+
+
+def load_attributes(path=CSV_PATH, exclude_blurry=False, chunksize=CHUNK_SIZE):
+    """(image_ids, attr_names, int8 (N, 40) matrix of 0/1) for the whole file."""
+    fmt = detect_format(path)
+    attr_names = fmt["attr_names"]
+    ids, matrices = [], []
+    for chunk_ids, chunk in iter_attribute_chunks(path, chunksize, fmt):
+        ids.append(chunk_ids)
+        matrices.append(chunk)
+    ids = np.concatenate(ids) if ids else np.empty(0, dtype=object)
+    matrix = np.concatenate(matrices) if matrices else np.empty((0, len(attr_names)), dtype=np.int8)
+
+    if exclude_blurry and "Blurry" in attr_names:
+        keep = matrix[:, attr_names.index("Blurry")] == 0
+        ids, matrix = ids[keep], matrix[keep]
+    return ids, attr_names, matrix
+
+
+def attribute_sets(ids, attr_names, matrix):
+    """{attribute: set of image IDs with the attribute} for O(1) set intersections."""
+    return {name: set(ids[matrix[:, i] == 1].tolist()) for i, name in enumerate(attr_names)}
+
+
+def match_mask(attr_names, matrix, attrs, gender=None):
+    """Boolean mask of rows having all `attrs` (and matching gender "male"/"female" if given)."""
+    mask = np.ones(len(matrix), dtype=bool)
+    for a in attrs:
+        if a in attr_names:
+            mask &= matrix[:, attr_names.index(a)] == 1
+    if gender is not None and "Male" in attr_names:
+        mask &= (matrix[:, attr_names.index("Male")] == 1) == (gender == "male")
+    return mask
@@ -0,0 +1,223 @@
+"""
+CelebA Embedding Store + Nearest-Neighbour Search
+Offline job that embeds all aligned CelebA images in batches and stores them as a
+memory-mapped float16 matrix, plus an IVF (inverted file) index for fast approximate
+top-k search, filterable by the 40-attribute bitmap.
+
+Store layout (.cache/celeba_embeddings/<extractor>/):
+    embeddings.f16     (N, dim) float16, L2-normalised, memory-mapped
+    ids.txt            image ID per row
+    attr_bits.npy      (N,) uint64, bit i = attribute i is set
+    ivf_centroids.npy  (nlist, dim) float32 coarse quantizer
+    ivf_order.npy      row indices sorted by IVF list
+    ivf_offsets.npy    (nlist + 1,) start of each list in ivf_order
+    meta.json          extractor, dim, count, attribute names, progress
+
+    python src/prompt_generator/celeba_embeddings.py build --extractor clip
+    python src/prompt_generator/celeba_embeddings.py search path/to/generated.png --attrs Male Smiling
+"""
+import os
+import json
+import time
+import argparse
+import numpy as np
+
+from image_features import get_extractor, resolve_image_path, load_images
+from celeba_attrs import load_attributes
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+CSV_PATH = os.path.join(project_root, "res", "list_attr_celeba.csv")
+IMG_ALIGNED_PATH = os.path.join(project_root, "res", "img_align_celeba_png")
+STORE_ROOT = os.path.join(project_root, ".cache", "celeba_embeddings")
+EMBEDDING_EXTRACTOR = os.getenv("EMBEDDING_EXTRACTOR", "clip")
+
+
+def pack_bits(matrix):
+    """(N, <=64) 0/1 matrix -> (N,) uint64 bitmaps."""
+    weights = np.left_shift(np.uint64(1), np.arange(matrix.shape[1], dtype=np.uint64))
+    return (matrix.astype(np.uint64) * weights).sum(axis=1, dtype=np.uint64)
+
+
+def attr_mask(attr_names, attrs):
+    mask = np.uint64(0)
+    for a in attrs:
+        mask |= np.uint64(1) << np.uint64(attr_names.index(a))
+    return mask
+
+
+def _normalize(x):
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def spherical_kmeans(data, k, iters=10, seed=0):
+    """Cosine k-means on L2-normalised rows. Returns (k, dim) float32 centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = data[rng.choice(len(data), size=k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        assign = np.argmax(data @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        counts = np.bincount(assign, minlength=k)
+        empty = counts == 0
+        # Re-seed empty clusters with random points
+        sums[empty] = data[rng.choice(len(data), size=int(empty.sum()), replace=False)]
+        centroids = _normalize(sums).astype(np.float32)
+    return centroids
+
+
+# === BUILD ===
+
+def build_store(extractor_name=EMBEDDING_EXTRACTOR, csv_path=CSV_PATH, image_dir=IMG_ALIGNED_PATH,
+                store_root=STORE_ROOT, nlist=None, chunk=4096):
+    extractor = get_extractor(extractor_name)
+    store_dir = os.path.join(store_root, extractor.name)
+    os.makedirs(store_dir, exist_ok=True)
+
+    ids, attr_names, matrix = load_attributes(csv_path)
+    ids = ids.tolist()
+    paths = [resolve_image_path(image_dir, i) for i in ids]
+    keep = [i for i, p in enumerate(paths) if p]
+    ids = [ids[i] for i in keep]
+    paths = [paths[i] for i in keep]
+    matrix = matrix[keep]
+    n = len(ids)
+    print(f"Embedding {n:,} images with '{extractor.name}' ({extractor.dim} dims)...")
+
+    meta_path = os.path.join(store_dir, "meta.json")
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    # Resume a partial build with the same image list
+    done = meta.get("done", 0) if meta.get("count") == n and meta.get("dim") == extractor.dim else 0
+
+    emb_path = os.path.join(store_dir, "embeddings.f16")
+    embeddings = np.memmap(emb_path, dtype=np.float16, mode="r+" if done else "w+", shape=(n, extractor.dim))
+    with open(os.path.join(store_dir, "ids.txt"), "w") as f:
+        f.write("\n".join(ids))
+    np.save(os.path.join(store_dir, "attr_bits.npy"), pack_bits(matrix))
+
+    meta = {"extractor": extractor.name, "dim": extractor.dim, "count": n, "attr_names": attr_names, "done": done}
+    start = time.time()
+    for lo in range(done, n, extractor.batch_size):
+        hi = min(lo + extractor.batch_size, n)
+        embeddings[lo:hi] = _normalize(extractor(load_images(paths[lo:hi])))
+        if hi % chunk < extractor.batch_size or hi == n:
+            embeddings.flush()
+            meta["done"] = hi
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+            rate = (hi - done) / (time.time() - start)
+            print(f"  {hi:,}/{n:,} ({rate:.0f} img/s)")
+
+    build_ivf(store_dir, embeddings, nlist)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    print(f"Saved embedding store to {store_dir}")
+
+
+def build_ivf(store_dir, embeddings, nlist=None, train_size=50000, chunk=65536):
+    n = len(embeddings)
+    nlist = nlist or max(1, int(4 * np.sqrt(n)))
+    rng = np.random.default_rng(0)
+    sample = np.asarray(embeddings[np.sort(rng.choice(n, size=min(n, train_size), replace=False))], dtype=np.float32)
+    centroids = spherical_kmeans(sample, min(nlist, len(sample)))
+
+    assign = np.empty(n, dtype=np.int32)
+    for lo in range(0, n, chunk):
+        assign[lo:lo + chunk] = np.argmax(np.asarray(embeddings[lo:lo + chunk], dtype=np.float32) @ centroids.T, axis=1)
+
+    order = np.argsort(assign, kind="stable").astype(np.int32)
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=len(centroids)))]).astype(np.int64)
+    np.save(os.path.join(store_dir, "ivf_centroids.npy"), centroids)
+    np.save(os.path.join(store_dir, "ivf_order.npy"), order)
+    np.save(os.path.join(store_dir, "ivf_offsets.npy"), offsets)
+    print(f"Built IVF index with {len(centroids):,} lists")
+
+
+# === SEARCH ===
+
+class EmbeddingIndex:
+    def __init__(self, store_dir):
+        with open(os.path.join(store_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.attr_names = self.meta["attr_names"]
+        n, dim = self.meta["count"], self.meta["dim"]
+        self.embeddings = np.memmap(os.path.join(store_dir, "embeddings.f16"), dtype=np.float16, mode="r", shape=(n, dim))
+        with open(os.path.join(store_dir, "ids.txt")) as f:
+            self.ids = f.read().split("\n")
+        self.bits = np.load(os.path.join(store_dir, "attr_bits.npy"))
+        self.centroids = np.load(os.path.join(store_dir, "ivf_centroids.npy"))
+        self.order = np.load(os.path.join(store_dir, "ivf_order.npy"))
+        self.offsets = np.load(os.path.join(store_dir, "ivf_offsets.npy"))
+
+    @classmethod
+    def load(cls, extractor_name=EMBEDDING_EXTRACTOR, store_root=STORE_ROOT):
+        return cls(os.path.join(store_root, extractor_name))
+
+    @staticmethod
+    def exists(extractor_name=EMBEDDING_EXTRACTOR, store_root=STORE_ROOT):
+        return os.path.exists(os.path.join(store_root, extractor_name, "ivf_offsets.npy"))
+
+    def search(self, query, k=8, required=(), excluded=(), nprobe=16):
+        """
+        Top-k (image_id, cosine similarity) for an embedding.
+        `required` attributes must be set, `excluded` must not be (e.g. excluded=["Male"] for women).
+        Probes more lists if the filter leaves fewer than k candidates.
+        """
+        query = _normalize(np.asarray(query, dtype=np.float32).ravel())
+        req = attr_mask(self.attr_names, required)
+        exc = attr_mask(self.attr_names, excluded)
+        list_order = np.argsort(-(self.centroids @ query))
+
+        nprobe = min(nprobe, len(list_order))
+        while True:
+            rows = np.concatenate([self.order[self.offsets[l]:self.offsets[l + 1]] for l in list_order[:nprobe]])
+            bits = self.bits[rows]
+            rows = rows[((bits & req) == req) & ((bits & exc) == 0)]
+            if len(rows) >= k or nprobe == len(list_order):
+                break
+            nprobe = min(nprobe * 2, len(list_order))
+
+        rows.sort()  # sequential memmap reads
+        scores = np.asarray(self.embeddings[rows], dtype=np.float32) @ query
+        top = np.argsort(-scores)[:k]
+        return [(self.ids[rows[i]], float(scores[i])) for i in top]
+
+    def search_image(self, image, extractor, k=8, required=(), excluded=(), nprobe=16):
+        """Embed a PIL image with `extractor` (must match the store) and search."""
+        return self.search(extractor([image.convert("RGB")])[0], k, required, excluded, nprobe)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Embed all aligned CelebA images and build the IVF index")
+    p_build.add_argument("--extractor", type=str, default=EMBEDDING_EXTRACTOR)
+    p_build.add_argument("--csv_path", type=str, default=CSV_PATH)
+    p_build.add_argument("--image_dir", type=str, default=IMG_ALIGNED_PATH)
+    p_build.add_argument("--nlist", type=int, default=None)
+
+    p_search = sub.add_parser("search", help="Nearest CelebA faces for an image")
+    p_search.add_argument("image", type=str)
+    p_search.add_argument("--extractor", type=str, default=EMBEDDING_EXTRACTOR)
+    p_search.add_argument("--attrs", nargs="*", default=[], help="Required attributes")
+    p_search.add_argument("--k", type=int, default=8)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_store(args.extractor, args.csv_path, args.image_dir, nlist=args.nlist)
+    else:
+        index = EmbeddingIndex.load(args.extractor)
+        query = get_extractor(args.extractor)(load_images([args.image]))[0]
+        t0 = time.perf_counter()
+        results = index.search(query, k=args.k, required=args.attrs)
+        print(f"Search took {(time.perf_counter() - t0) * 1000:.1f} ms")
+        for img_id, score in results:
+            print(f"  {img_id}  {score:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Image Feature Extractors
+Pluggable feature extractors for comparing generated portraits with CelebA images.
+
+Each extractor is a callable taking a list of PIL images and returning a float32
+array of shape (N, dim). Pick one by name with get_extractor():
+- "tiny": 8x8 RGB thumbnail + per-channel colour histograms (216 dims). Numpy only, very fast.
+- "clip": CLIP ViT-B/32 image embeddings (512 dims, L2-normalised). Downloads weights once.
+"""
+import os
+import numpy as np
+from PIL import Image
+
+IMAGE_EXTENSIONS = [".png", ".jpg", ".jpeg"]
+
+
+def resolve_image_path(base_path, img_id):
+    """CelebA IDs end in .jpg but the aligned set may be PNG; try the known extensions."""
+    img_path = os.path.join(base_path, img_id)
+    if os.path.exists(img_path):
+        return img_path
+    base, _ = os.path.splitext(img_id)
+    for ext in IMAGE_EXTENSIONS:
+        test_path = os.path.join(base_path, base + ext)
+        if os.path.exists(test_path):
+            return test_path
+    return None
+
+
+def load_images(paths):
+    return [Image.open(p).convert("RGB") for p in paths]
+
+
+class TinyFeatures:
+    """Downsampled pixels + colour histograms. Cheap baseline, no model weights."""
+    name = "tiny"
+    dim = 8 * 8 * 3 + 3 * 8
+    batch_size = 256
+
+    def __call__(self, images):
+        feats = np.empty((len(images), self.dim), dtype=np.float32)
+        for i, img in enumerate(images):
+            arr = np.asarray(img.convert("RGB"), dtype=np.uint8)
+            thumb = np.asarray(img.convert("RGB").resize((8, 8), Image.BILINEAR), dtype=np.float32) / 255.0
+            hist = [np.histogram(arr[..., c], bins=8, range=(0, 256))[0] for c in range(3)]
+            hist = np.concatenate(hist).astype(np.float32) / arr[..., 0].size
+            feats[i] = np.concatenate([thumb.ravel(), hist])
+        return feats
+
+
+class ClipFeatures:
+    """CLIP image embeddings via transformers."""
+    name = "clip"
+    dim = 512
+    batch_size = 64
+
+    def __init__(self, model_id="openai/clip-vit-base-patch32", device=None):
+        import torch
+        from transformers import CLIPImageProcessor, CLIPVisionModelWithProjection
+        self.torch = torch
+        self.device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+        self.processor = CLIPImageProcessor.from_pretrained(model_id)
+        self.model = CLIPVisionModelWithProjection.from_pretrained(model_id).to(self.device).eval()
+        self.dim = self.model.config.projection_dim
+
+    def __call__(self, images):
+        with self.torch.inference_mode():
+            inputs = self.processor(images=images, return_tensors="pt").to(self.device)
+            embeds = self.model(**inputs).image_embeds
+            embeds = embeds / embeds.norm(dim=-1, keepdim=True)
+        return embeds.float().cpu().numpy()
+
+
+EXTRACTORS = {
+    "tiny": TinyFeatures,
+    "clip": ClipFeatures,
+}
+
+
+def get_extractor(name):
+    if name not in EXTRACTORS:
+        raise ValueError(f"Unknown feature extractor '{name}'. Choose from: {', '.join(EXTRACTORS)}")
+    return EXTRACTORS[name]()
+
+
+def extract_features(extractor, paths):
+    """Extract features for image files in extractor-sized batches."""
+    feats = np.empty((len(paths), extractor.dim), dtype=np.float32)
+    for start in range(0, len(paths), extractor.batch_size):
+        batch = paths[start:start + extractor.batch_size]
+        feats[start:start + len(batch)] = extractor(load_images(batch))
+    return feats
@@ -0,0 +1,241 @@
+"""
+VAE Latent Cache
+Encodes the retained CelebA fine-tuning images through the SD3.5 VAE once, so training and
+evaluation can read latents directly instead of decoding images and running the VAE encoder
+every epoch.
+
+Retained images = images matching at least one prompt combination with >= --min_matches
+images in celeba_prompt_stats.csv (see README, "Proposed Filtering Strategy").
+
+Cache layout (.cache/latents/<model>_<resolution>/):
+    shard_00000.npy ...  (shard_size, C, H/8, W/8) float16, already shifted and scaled
+                         by the VAE's shift_factor / scaling_factor (ready for the transformer)
+    ids.txt              image ID per row; row i lives in shard i // shard_size
+    meta.json            model, resolution, latent shape, shard size, progress
+
+    python src/prompt_generator/latent_cache.py build --resolution 512
+    LatentCache.open().get_batch(["000001.jpg", "000002.jpg"])  -> (2, 16, 64, 64) array
+"""
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from image_features import resolve_image_path
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+CSV_PATH = os.path.join(project_root, "res", "list_attr_celeba.csv")
+IMG_ALIGNED_PATH = os.path.join(project_root, "res", "img_align_celeba_png")
+PROMPT_STATS_CSV = os.path.join(current_dir, "celeba_prompt_stats.csv")
+LATENT_ROOT = os.path.join(project_root, ".cache", "latents")
+DEFAULT_MODEL = "stabilityai/stable-diffusion-3.5-medium"
+
+# Same HF cache as the comparison runner
+os.environ.setdefault("HF_HOME", os.path.join(project_root, ".cache"))
+
+
+def retained_image_ids(csv_path=CSV_PATH, stats_csv=PROMPT_STATS_CSV, min_matches=200):
+    """Sorted IDs of all images matching at least one retained prompt combination."""
+    from celeba_attrs import load_attributes, attribute_sets
+    attr_sets = attribute_sets(*load_attributes(csv_path, exclude_blurry=True))
+    male = attr_sets.get("Male", set())
+
+    retained = set()
+    with open(stats_csv, newline="") as f:
+        for row in csv.DictReader(f):
+            if int(row["Count"]) < min_matches:
+                continue
+            attrs = [row["Attribute_1"], row["Attribute_2"], row["Attribute_3"]]
+            match = set.intersection(*(attr_sets.get(a, set()) for a in attrs))
+            retained |= match & male if row["Gender"] == "male" else match - male
+    return sorted(retained)
+
+
+def preprocess(path, resolution):
+    """Resize shorter side, center crop, scale to [-1, 1], CHW float32."""
+    img = Image.open(path).convert("RGB")
+    scale = resolution / min(img.size)
+    img = img.resize((round(img.width * scale), round(img.height * scale)), Image.BICUBIC)
+    left = (img.width - resolution) // 2
+    top = (img.height - resolution) // 2
+    img = img.crop((left, top, left + resolution, top + resolution))
+    arr = np.asarray(img, dtype=np.float32) / 127.5 - 1.0
+    return arr.transpose(2, 0, 1)
+
+
+def cache_dir_for(model_id, resolution, root=LATENT_ROOT):
+    return os.path.join(root, f"{model_id.split('/')[-1]}_{resolution}")
+
+
+def build_cache(model_id=DEFAULT_MODEL, resolution=512, batch_size=16, shard_size=8192,
+                csv_path=CSV_PATH, image_dir=IMG_ALIGNED_PATH, min_matches=200, root=LATENT_ROOT):
+    import torch
+    from diffusers import AutoencoderKL
+
+    out_dir = cache_dir_for(model_id, resolution, root)
+    os.makedirs(out_dir, exist_ok=True)
+
+    ids = retained_image_ids(csv_path, min_matches=min_matches)
+    paths = [resolve_image_path(image_dir, i) for i in ids]
+    ids = [i for i, p in zip(ids, paths) if p]
+    paths = [p for p in paths if p]
+    n = len(ids)
+
+    meta_path = os.path.join(out_dir, "meta.json")
+    previous = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            previous = json.load(f)
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    dtype = torch.float16 if device == "cuda" else torch.float32
+    vae = AutoencoderKL.from_pretrained(model_id, subfolder="vae", torch_dtype=dtype).to(device).eval()
+    shift, scale = vae.config.shift_factor or 0.0, vae.config.scaling_factor
+    factor = 2 ** (len(vae.config.block_out_channels) - 1)
+    latent_shape = [vae.config.latent_channels, resolution // factor, resolution // factor]
+
+    meta = {
+        "model_id": model_id, "resolution": resolution, "latent_shape": latent_shape,
+        "shift_factor": shift, "scaling_factor": scale,
+        "vae_hash": hashlib.sha1(json.dumps(dict(vae.config), sort_keys=True, default=str).encode()).hexdigest(),
+        "ids_hash": hashlib.sha1("\n".join(ids).encode()).hexdigest(),
+        "count": n, "shard_size": shard_size,
+    }
+    # Resume only if the image list, VAE, latent shape and shard layout are all unchanged
+    resume = all(previous.get(k) == v for k, v in meta.items())
+    done = meta["done"] = previous.get("done", 0) if resume else 0
+
+    with open(os.path.join(out_dir, "ids.txt"), "w") as f:
+        f.write("\n".join(ids))
+    # Written right away, so readers never pair the new IDs with an old "done" count
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Encoding {n - done:,} of {n:,} images -> {latent_shape} latents on {device}...")
+
+    shards = {}
+
+    def shard(idx):
+        if idx not in shards:
+            path = os.path.join(out_dir, f"shard_{idx:05d}.npy")
+            rows = min(shard_size, n - idx * shard_size)
+            if resume and os.path.exists(path):
+                shards[idx] = np.load(path, mmap_mode="r+")
+            else:
+                # Not resuming: recreate, so rows from an older build are never reused
+                shards[idx] = np.lib.format.open_memmap(path, mode="w+", dtype=np.float16, shape=(rows, *latent_shape))
+        return shards[idx]
+
+    def load_batch(lo):
+        batch_paths = paths[lo:lo + batch_size]
+        return np.stack([preprocess(p, resolution) for p in batch_paths])
+
+    start = time.time()
+    starts = list(range(done, n, batch_size))
+    # Decode/preprocess the next batch on a thread while the VAE encodes the current one
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = pool.submit(load_batch, starts[0]) if starts else None
+        for k, lo in enumerate(starts):
+            pixels = pending.result()
+            if k + 1 < len(starts):
+                pending = pool.submit(load_batch, starts[k + 1])
+
+            with torch.inference_mode():
+                x = torch.from_numpy(pixels).to(device, dtype)
+                latents = (vae.encode(x).latent_dist.mean - shift) * scale
+            latents = latents.float().cpu().numpy().astype(np.float16)
+
+            for row, latent in zip(range(lo, lo + len(latents)), latents):
+                shard(row // shard_size)[row % shard_size] = latent
+
+            hi = lo + len(latents)
+            if hi // shard_size != lo // shard_size or hi == n or k % 50 == 49:
+                for s in shards.values():
+                    s.flush()
+                meta["done"] = hi
+                with open(meta_path, "w") as f:
+                    json.dump(meta, f, indent=2)
+                rate = (hi - done) / (time.time() - start)
+                print(f"  {hi:,}/{n:,} ({rate:.1f} img/s)")
+
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    print(f"Saved latent cache to {out_dir}")
+
+
+class LatentCache:
+    """Read-only access to cached latents by image ID."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        with open(os.path.join(cache_dir, "ids.txt")) as f:
+            ids = f.read().split("\n")[:self.meta["done"]]
+        self.rows = {img_id: i for i, img_id in enumerate(ids)}
+        self.shard_size = self.meta["shard_size"]
+        self.shards = {}
+
+    @classmethod
+    def open(cls, model_id=DEFAULT_MODEL, resolution=512, root=LATENT_ROOT):
+        return cls(cache_dir_for(model_id, resolution, root))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, img_id):
+        return img_id in self.rows
+
+    def _shard(self, idx):
+        if idx not in self.shards:
+            self.shards[idx] = np.load(os.path.join(self.cache_dir, f"shard_{idx:05d}.npy"), mmap_mode="r")
+        return self.shards[idx]
+
+    def get(self, img_id):
+        row = self.rows[img_id]
+        return np.asarray(self._shard(row // self.shard_size)[row % self.shard_size])
+
+    def get_batch(self, img_ids):
+        """(len(img_ids), C, h, w) float16; reads are grouped per shard in row order."""
+        out = np.empty((len(img_ids), *self.meta["latent_shape"]), dtype=np.float16)
+        rows = np.array([self.rows[i] for i in img_ids])
+        for shard_idx in np.unique(rows // self.shard_size):
+            sel = np.flatnonzero(rows // self.shard_size == shard_idx)
+            sel = sel[np.argsort(rows[sel])]
+            out[sel] = self._shard(shard_idx)[rows[sel] % self.shard_size]
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_build = sub.add_parser("build", help="Encode retained CelebA images to latents")
+    p_build.add_argument("--model_id", type=str, default=DEFAULT_MODEL)
+    p_build.add_argument("--resolution", type=int, default=512)
+    p_build.add_argument("--batch_size", type=int, default=16)
+    p_build.add_argument("--shard_size", type=int, default=8192)
+    p_build.add_argument("--min_matches", type=int, default=200)
+    p_build.add_argument("--csv_path", type=str, default=CSV_PATH)
+    p_build.add_argument("--image_dir", type=str, default=IMG_ALIGNED_PATH)
+
+    p_info = sub.add_parser("info", help="Show cache contents")
+    p_info.add_argument("--model_id", type=str, default=DEFAULT_MODEL)
+    p_info.add_argument("--resolution", type=int, default=512)
+
+    args = parser.parse_args()
+    if args.command == "build":
+        build_cache(args.model_id, args.resolution, args.batch_size, args.shard_size,
+                    args.csv_path, args.image_dir, args.min_matches)
+    else:
+        cache = LatentCache.open(args.model_id, args.resolution)
+        print(f"{cache.cache_dir}: {len(cache):,} latents of shape {tuple(cache.meta['latent_shape'])}")
+
+
+if __name__ == "__main__":
+    main()
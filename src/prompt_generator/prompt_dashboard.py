@@ -9,89 +9,63 @@ IMPORTANT NOTE (keep this in no matter what you change):
 """
 import streamlit as st
 import random
-import csv
 import os
 from PIL import Image
 
 # Import generator
 from prompt_generator import (
     generate_prompt, 
-    ATTR_TO_TEXT, 
     get_all_buckets
 )
+from prompt_templates import PromptTemplate, PHRASINGS, STYLE_SUFFIXES
+from celeba_embeddings import EmbeddingIndex, EMBEDDING_EXTRACTOR
+from image_features import get_extractor, resolve_image_path
+from rerun_profiler import get_profiler
+from thumbnails import ThumbnailService
+from celeba_attrs import load_attributes, match_mask
 
 st.set_page_config(page_title="CelebA Prompt Explorer", layout="wide")
 
+# Per-rerun timings (enable with DASHBOARD_PROFILE=True or ?profile=1)
+profiler = get_profiler("prompt_dashboard")
+
 # Paths
 CSV_PATH = "res/list_attr_celeba.csv"
 IMG_ALIGNED_PATH = "res/img_align_celeba_png"
 IMG_FULL_PATH = "res/img_celeba"
 
-@st.cache_data
+@profiler.cache_data
 def load_dataset():
-    """Load and parse the CelebA attribute CSV."""
-    rows = []
-    attr_names = []
-    
-    with open(CSV_PATH, 'r') as f:
-        reader = csv.reader(f)
-        first_line = next(reader)
-        if len(first_line) == 1 and first_line[0].isdigit():
-            attr_names = next(reader)
-        else:
-            attr_names = first_line
-        
-        attr_names = [h.strip() for h in attr_names]
-        if len(attr_names) == 1 and ' ' in attr_names[0]:
-            attr_names = attr_names[0].split()
-        
-        id_col = attr_names[0]
-        attr_names = attr_names[1:] if 'image' in id_col.lower() or len(attr_names) == 41 else attr_names
-        
-        blurry_idx = attr_names.index('Blurry') if 'Blurry' in attr_names else -1
-        
-        for line in reader:
-            parts = line[0].split() if len(line) == 1 and ' ' in line[0] else line
-            image_id = parts[0]
-            attrs = [1 if int(val) == 1 else 0 for val in parts[1:]]
-            
-            if len(attrs) == len(attr_names):
-                # Exclude blurry
-                if blurry_idx >= 0 and attrs[blurry_idx] == 1:
-                    continue
-                rows.append({"image_id": image_id, "attrs": attrs})
-    
-    return attr_names, rows
+    """Load the CelebA attribute CSV: (attr_names, image_ids, int8 0/1 matrix), Blurry excluded."""
+    ids, attr_names, matrix = load_attributes(CSV_PATH, exclude_blurry=True)
+    return attr_names, ids, matrix
+
+
+@st.cache_resource
+def load_embedding_index():
+    """Embedding store + extractor for nearest-neighbour search (None if not built yet)."""
+    if not EmbeddingIndex.exists():
+        return None, None
+    return EmbeddingIndex.load(), get_extractor(EMBEDDING_EXTRACTOR)
+
+
+@st.cache_resource
+def thumbnail_service(image_dir):
+    """Filename index + on-disk thumbnail cache, built once per image directory."""
+    return ThumbnailService(image_dir)
 
 
-def find_matching_images(attr_names, rows, selected_attrs, gender):
+def find_matching_images(attr_names, ids, matrix, selected_attrs, gender):
     """Find images matching the selected attributes."""
-    gender_idx = attr_names.index("Male") if "Male" in attr_names else -1
-    
-    matching = []
-    for row in rows:
-        if gender_idx >= 0:
-            is_male = row["attrs"][gender_idx] == 1
-            if (gender == "male" and not is_male) or (gender == "female" and is_male):
-                continue
-        
-        match = True
-        for attr in selected_attrs:
-            if attr in attr_names and row["attrs"][attr_names.index(attr)] != 1:
-                match = False
-                break
-        
-        if match:
-            matching.append(row["image_id"])
-    
-    return matching
+    return ids[match_mask(attr_names, matrix, selected_attrs, gender)].tolist()
 
 
 # === UI ===
 st.title("🖼️ CelebA Prompt Explorer (v9)")
 
-attr_names, rows = load_dataset()
-st.caption(f"Dataset: {len(rows):,} images (Blurry excluded)")
+with profiler.section("load dataset"):
+    attr_names, image_ids, attr_matrix = load_dataset()
+st.caption(f"Dataset: {len(image_ids):,} images (Blurry excluded)")
 
 generate_btn = st.button("🎲 Generate Random Prompt", type="primary")
 
@@ -125,13 +99,17 @@ attr_3 = render_slot(col_3, "Slot #3", 2)
 selected_attrs = [attr_1, attr_2, attr_3]
 
 # Build prompt text
-gender_word = "man" if gender == "male" else "woman"
-text_attrs = [ATTR_TO_TEXT.get(a, a.lower().replace("_", " ")) for a in selected_attrs]
-prompt_text = f"A realistic portrait of a {gender_word}, with {text_attrs[0]}, {text_attrs[1]}, and {text_attrs[2]}."
+tpl_col1, tpl_col2 = st.columns(2)
+with tpl_col1:
+    phrasing = st.selectbox("Phrasing", list(PHRASINGS))
+with tpl_col2:
+    style = st.selectbox("Style", list(STYLE_SUFFIXES))
+template = PromptTemplate(phrasing, style)
+prompt_text = template.render(gender, selected_attrs)
 
 # Handle random generation
 if generate_btn:
-    result = generate_prompt()
+    result = generate_prompt(template=template)
     prompt_text = result["prompt"]
     gender = result["gender"]
     selected_attrs = result["attributes"]
@@ -147,7 +125,8 @@ st.divider()
 st.subheader("Matching Images")
 
 prompt_key = f"{gender}_{'-'.join(sorted(selected_attrs))}"
-matching_images = find_matching_images(attr_names, rows, selected_attrs, gender)
+with profiler.section("matching scan"):
+    matching_images = find_matching_images(attr_names, image_ids, attr_matrix, selected_attrs, gender)
 
 ctrl_col1, ctrl_col2, ctrl_col3 = st.columns([1, 1, 2])
 with ctrl_col1:
@@ -171,25 +150,48 @@ if should_resample and len(matching_images) > 0:
     st.session_state["current_prompt_key"] = prompt_key
 
 # Display grid
-if sampled_images and len(sampled_images) > 0:
-    cols = st.columns(5)
-    for i, img_id in enumerate(sampled_images):
-        img_path = os.path.join(img_base_path, img_id)
-        if not os.path.exists(img_path):
-            base, ext = os.path.splitext(img_id)
-            for try_ext in [".png", ".jpg", ".jpeg"]:
-                test_path = os.path.join(img_base_path, base + try_ext)
-                if os.path.exists(test_path):
-                    img_path = test_path
-                    break
-        
-        with cols[i % 5]:
-            if os.path.exists(img_path):
-                img = Image.open(img_path)
-                # Replaced use_container_width=True with width='stretch' per instruction
-                st.image(img, caption=img_id, width='stretch')
-            else:
-                st.warning(f"Not found: {img_id}")
-elif len(matching_images) == 0:
-    st.info("No matching images found for this combination.")
-    
\ No newline at end of file
+with profiler.section("image grid"):
+    if sampled_images and len(sampled_images) > 0:
+        cols = st.columns(5)
+        thumb_paths = thumbnail_service(img_base_path).get_many(sampled_images)
+        for i, (img_id, thumb_path) in enumerate(zip(sampled_images, thumb_paths)):
+            with cols[i % 5]:
+                if thumb_path:
+                    # Replaced use_container_width=True with width='stretch' per instruction
+                    st.image(thumb_path, caption=img_id, width='stretch')
+                else:
+                    st.warning(f"Not found: {img_id}")
+    elif len(matching_images) == 0:
+        st.info("No matching images found for this combination.")
+    
+
+
+# === NEAREST REAL FACES ===
+st.divider()
+st.subheader("Nearest Real Faces")
+
+with profiler.section("nearest faces"):
+    index, extractor = load_embedding_index()
+    if index is None:
+        st.info("Embedding store not built yet. Run `python src/prompt_generator/celeba_embeddings.py build`.")
+    else:
+        uploaded = st.file_uploader("Generated image", type=["png", "jpg", "jpeg", "webp"])
+        filter_by_prompt = st.toggle("Only faces matching the prompt attributes", value=True)
+        if uploaded is not None:
+            query_img = Image.open(uploaded)
+            required, excluded = [], []
+            if filter_by_prompt:
+                required = list(selected_attrs) + (["Male"] if gender == "male" else [])
+                excluded = ["Male"] if gender == "female" else []
+            neighbours = index.search_image(query_img, extractor, k=9, required=required, excluded=excluded)
+
+            nn_cols = st.columns(5)
+            with nn_cols[0]:
+                st.image(query_img, caption="Query", width='stretch')
+            for i, (img_id, score) in enumerate(neighbours):
+                img_path = resolve_image_path(IMG_ALIGNED_PATH, img_id)
+                with nn_cols[(i + 1) % 5]:
+                    if img_path:
+                        st.image(img_path, caption=f"{img_id} ({score:.2f})", width='stretch')
+
+profiler.finish()
@@ -4,54 +4,8 @@ Based on Dataset_Analysis.md Unified Bucket Structure
 """
 import random
 
-# Attribute to natural language mapping
-ATTR_TO_TEXT = {
-    # Facial Hair
-    "5_o_Clock_Shadow": "a five o'clock shadow",
-    "Goatee": "a goatee",
-    "Mustache": "a mustache",
-    "Sideburns": "sideburns",
-    # Makeup & Style
-    "Wearing_Lipstick": "wearing lipstick",
-    "Heavy_Makeup": "heavy makeup",
-    "Wearing_Earrings": "wearing earrings",
-    "Wearing_Necklace": "wearing a necklace",
-    # Hair Structure
-    "Straight_Hair": "straight hair",
-    "Wavy_Hair": "wavy hair",
-    "Receding_Hairline": "a receding hairline",
-    "Bangs": "bangs",
-    "Bald": "a bald head",
-    # Hair Color
-    "Black_Hair": "black hair",
-    "Brown_Hair": "brown hair",
-    "Blond_Hair": "blond hair",
-    "Gray_Hair": "gray hair",
-    # Face Shape
-    "High_Cheekbones": "high cheekbones",
-    "Oval_Face": "an oval face",
-    "Double_Chin": "a double chin",
-    "Chubby": "chubby cheeks",
-    # Eyebrows
-    "Bushy_Eyebrows": "bushy eyebrows",
-    "Arched_Eyebrows": "arched eyebrows",
-    # Nose
-    "Big_Nose": "a prominent nose",
-    "Pointy_Nose": "a pointy nose",
-    # Other
-    "Young": "a youthful appearance",
-    "Attractive": "an attractive look",
-    "Smiling": "a smile",
-    "Mouth_Slightly_Open": "slightly parted lips",
-    "Bags_Under_Eyes": "bags under the eyes",
-    "Big_Lips": "full lips",
-    "Narrow_Eyes": "narrow eyes",
-    "Rosy_Cheeks": "rosy cheeks",
-    "Pale_Skin": "pale skin",
-    "Eyeglasses": "wearing eyeglasses",
-    "Wearing_Hat": "wearing a hat",
-    "Wearing_Necktie": "wearing a necktie",
-}
+# Attribute text + prompt templates live in prompt_templates.py (ATTR_TO_TEXT re-exported here)
+from prompt_templates import ATTR_TO_TEXT, DEFAULT_TEMPLATE
 
 # Unified bucket definitions with weights (from Dataset_Analysis.md)
 # Un-normalized weights are used here; logic normalizes them on the fly.
@@ -77,21 +31,33 @@ BUCKETS = {
 }
 
 
-def weighted_choice(weights_dict):
-    """Sample one key from a dict of {key: weight}."""
+def weighted_choice(weights_dict, rng=None):
+    """Sample one key from a dict of {key: weight}. `rng`: random.Random instance (default: global random)."""
+    rng = rng or random
     items = list(weights_dict.keys())
     weights = list(weights_dict.values())
     total = sum(weights)
     normalized = [w / total for w in weights]
-    return random.choices(items, weights=normalized, k=1)[0]
+    return rng.choices(items, weights=normalized, k=1)[0]
+
+
+def max_attributes(gender=None):
+    """Most attributes one prompt can take (one per bucket; the smaller gender if `gender` is None)."""
+    genders = [gender] if gender else list(BUCKETS)
+    return min(len(BUCKETS[g]) for g in genders)
 
 
-def generate_prompt(gender=None):
-    """Generate a random prompt based on Dataset_Analysis.md probabilities enforcing bucket mutual exclusion."""
+def generate_prompt(gender=None, rng=None, num_attributes=3, template=None):
+    """
+    Generate a random prompt based on Dataset_Analysis.md probabilities enforcing bucket mutual exclusion.
+    Pass a seeded random.Random as `rng` for reproducible prompts (see prompt_set.py).
+    `template`: prompt_templates.PromptTemplate (default: "A realistic portrait of a ..., with ...").
+    """
+    rng = rng or random
     if gender is None:
-        gender = random.choice(["male", "female"])
-    
-    gender_word = "man" if gender == "male" else "woman"
+        gender = rng.choice(["male", "female"])
+    if not 1 <= num_attributes <= max_attributes(gender):
+        raise ValueError(f"num_attributes must be between 1 and {max_attributes(gender)} for {gender}, got {num_attributes}")
     
     # Track available buckets
     available_buckets = list(BUCKETS[gender].keys())
@@ -99,15 +65,15 @@ def generate_prompt(gender=None):
     selected_buckets = []
     selected_attrs = []
     
-    # Pick 3 attributes from 3 distinct buckets
-    for _ in range(3):
+    # Pick N attributes from distinct buckets ('other' may repeat)
+    for _ in range(num_attributes):
         # Normalize current available bucket weights
         current_weights = [BUCKETS[gender][b]["prob"] for b in available_buckets]
         total = sum(current_weights)
         norm_weights = [w / total for w in current_weights]
         
         # Select bucket
-        chosen_bucket = random.choices(available_buckets, weights=norm_weights, k=1)[0]
+        chosen_bucket = rng.choices(available_buckets, weights=norm_weights, k=1)[0]
         selected_buckets.append(chosen_bucket)
 
         # Get attributes for this bucket
@@ -119,7 +85,7 @@ def generate_prompt(gender=None):
             attrs_dict = {k: v for k, v in attrs_dict.items() if k not in selected_attrs}
 
         # Select attribute
-        chosen_attr = weighted_choice(attrs_dict)
+        chosen_attr = weighted_choice(attrs_dict, rng)
         selected_attrs.append(chosen_attr)
 
         # Remove bucket so it can't be picked again,
@@ -128,9 +94,7 @@ def generate_prompt(gender=None):
             available_buckets.remove(chosen_bucket)
         
     # Convert to text
-    text_attrs = [ATTR_TO_TEXT.get(attr, attr.lower().replace("_", " ")) for attr in selected_attrs]
-    
-    prompt = f"A realistic portrait of a {gender_word}, with {text_attrs[0]}, {text_attrs[1]}, and {text_attrs[2]}."
+    prompt = (template or DEFAULT_TEMPLATE).render(gender, selected_attrs)
     
     return {
         "prompt": prompt,
@@ -0,0 +1,221 @@
+"""
+Prompt Set Generator
+Builds a large, reproducible, de-duplicated prompt set (JSONL) for training or evaluation.
+
+- Candidates are produced in fixed-size blocks; block b is generated from its own stream
+  random.Random("<seed>-<b>"). Worker processes generate blocks in parallel, and the main
+  process consumes them in block order, so the output is identical for a given seed no
+  matter how many workers are used.
+- Duplicates are dropped through a set of 64-bit prompt hashes (not the prompt strings).
+- Per-combination quotas come from celeba_prompt_stats.csv: combinations with fewer than
+  --min_matches real images are rejected, and every other combination may appear at most
+  ceil(N * share_of_matches * --quota_slack) times, so the set follows the real data.
+- Every combination has at most num_attributes! distinct prompts (attribute orders), so the
+  quotas bound how many prompts can exist (max_prompts). The CLI refuses an N above that bound.
+- Accepted prompts are streamed to the output file as they are produced. Generation stops early
+  once STALL_BLOCKS consecutive blocks (in block order) add nothing (quotas / unique prompts
+  exhausted); the CLI then exits with status 1, since fewer than N prompts were written.
+- --check_workers generates the same set with several worker counts and exits with status 1
+  unless all files are identical (use an N the quotas cannot fill to cover the early stop).
+
+    python src/prompt_generator/prompt_set.py -n 10000 --seed 0 --workers 8
+    python src/prompt_generator/prompt_set.py -n 13000 --seed 0 --check_workers 1 2 8
+"""
+import os
+import sys
+import csv
+import json
+import math
+import random
+import hashlib
+import argparse
+import tempfile
+import itertools
+from multiprocessing import Pool
+
+from prompt_generator import generate_prompt, max_attributes
+from prompt_templates import PromptTemplate, PHRASINGS, STYLE_SUFFIXES
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+PROMPT_STATS_CSV = os.path.join(current_dir, "celeba_prompt_stats.csv")
+OUTPUT_DIR = os.path.join(project_root, "out", "prompts")
+BLOCK_SIZE = 1024
+# Consecutive blocks without a new prompt after which quotas / unique prompts count as exhausted
+STALL_BLOCKS = 16
+
+
+def prompt_hash(prompt):
+    return int.from_bytes(hashlib.blake2b(prompt.encode(), digest_size=8).digest(), "little")
+
+
+def generate_block(job):
+    """Candidates of one block: [(hash, result)]. Depends only on the job tuple."""
+    seed, block, block_size, gender, num_attributes, phrasing, style = job
+    rng = random.Random(f"{seed}-{block}")
+    template = PromptTemplate(phrasing, style)
+    results = [generate_prompt(gender, rng, num_attributes, template) for _ in range(block_size)]
+    return [(prompt_hash(r["prompt"]), r) for r in results]
+
+
+def load_quotas(n, stats_csv=PROMPT_STATS_CSV, min_matches=200, slack=1.5):
+    """{(gender, sorted attributes): max prompts} proportional to each combination's real match count."""
+    counts = {}
+    with open(stats_csv, newline="") as f:
+        for row in csv.DictReader(f):
+            count = int(row["Count"])
+            if count >= min_matches:
+                attrs = tuple(sorted([row["Attribute_1"], row["Attribute_2"], row["Attribute_3"]]))
+                counts[(row["Gender"], attrs)] = count
+    total = sum(counts.values())
+    return {key: math.ceil(n * count / total * slack) for key, count in counts.items()}
+
+
+def max_prompts(quotas, num_attributes=3):
+    """Upper bound on distinct prompts under `quotas` (one per attribute order per combination)."""
+    orders = math.factorial(num_attributes)
+    return sum(min(quota, orders) for quota in quotas.values())
+
+
+def generate_prompt_set(n, seed=0, workers=1, gender=None, quotas=None, output=None,
+                        block_size=BLOCK_SIZE, max_candidates=None, num_attributes=3,
+                        phrasing="portrait", style="none"):
+    """Write up to `n` prompts to `output` (JSONL). Returns counters ("accepted" < n if exhausted)."""
+    max_candidates = max_candidates or n * 50
+    # Nothing left to find once every possible prompt was accepted
+    n_possible = min(n, max_prompts(quotas, num_attributes)) if quotas is not None else n
+    # A plain set of int hashes: lookups are one C call per candidate, which a numpy table
+    # probed element by element from Python cannot beat
+    seen = set()
+    used = {}
+    stats = {"accepted": 0, "candidates": 0, "duplicates": 0, "no_quota": 0, "over_quota": 0}
+    # Blocks are submitted in waves so the pool never runs far ahead of the consumer.
+    # The wave only batches submission; stopping depends on block order alone (stalled).
+    wave = max(1, workers) * 4
+    stalled = 0
+
+    pool = Pool(workers) if workers > 1 else None
+    try:
+        with open(output, "w", encoding="utf-8", newline="\n") as f:
+            for wave_start in itertools.count(0, wave):
+                jobs = [(seed, b, block_size, gender, num_attributes, phrasing, style)
+                        for b in range(wave_start, wave_start + wave)]
+                blocks = pool.imap(generate_block, jobs) if pool else map(generate_block, jobs)
+                for block, candidates in zip(range(wave_start, wave_start + wave), blocks):
+                    accepted_before = stats["accepted"]
+                    for h, result in candidates:
+                        stats["candidates"] += 1
+                        if quotas is not None:
+                            key = (result["gender"], tuple(sorted(result["attributes"])))
+                            if key not in quotas:
+                                stats["no_quota"] += 1
+                                continue
+                            if used.get(key, 0) >= quotas[key]:
+                                stats["over_quota"] += 1
+                                continue
+                        if h in seen:
+                            stats["duplicates"] += 1
+                            continue
+                        seen.add(h)
+                        if quotas is not None:
+                            used[key] = used.get(key, 0) + 1
+
+                        f.write(json.dumps({
+                            "index": stats["accepted"],
+                            "prompt": result["prompt"],
+                            "gender": result["gender"],
+                            "attributes": result["attributes"],
+                            "buckets": result["selected_buckets"],
+                            "block": block,
+                        }) + "\n")
+                        stats["accepted"] += 1
+                        if stats["accepted"] == n_possible:
+                            return stats
+                    if stats["candidates"] >= max_candidates:
+                        print(f"⚠️ Stopped after {stats['candidates']:,} candidates: "
+                              "quotas / unique prompts exhausted before reaching N.")
+                        return stats
+                    stalled = stalled + 1 if stats["accepted"] == accepted_before else 0
+                    if stalled >= STALL_BLOCKS:
+                        print(f"⚠️ Stopped after {stats['candidates']:,} candidates: {STALL_BLOCKS} blocks in a row "
+                              f"({STALL_BLOCKS * block_size:,} candidates) added no prompt, quotas / unique prompts are exhausted.")
+                        return stats
+    finally:
+        if pool:
+            # Let the rest of the wave finish; terminate() can deadlock while blocks are being handed out
+            pool.close()
+            pool.join()
+
+
+def check_workers(worker_counts, n, seed=0, **kwargs):
+    """{workers: (sha1 of the output file, accepted)}; every worker count must give the same file."""
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in worker_counts:
+            output = os.path.join(tmp, f"prompts_workers{workers}.jsonl")
+            stats = generate_prompt_set(n, seed, workers, output=output, **kwargs)
+            with open(output, "rb") as f:
+                results[workers] = (hashlib.sha1(f.read()).hexdigest(), stats["accepted"])
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num_prompts", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--gender", type=str, choices=["male", "female"], default=None)
+    parser.add_argument("--num_attributes", type=int, default=3)
+    parser.add_argument("--phrasing", type=str, default="portrait", choices=list(PHRASINGS))
+    parser.add_argument("--style", type=str, default="none", choices=list(STYLE_SUFFIXES))
+    parser.add_argument("--stats_csv", type=str, default=PROMPT_STATS_CSV)
+    parser.add_argument("--min_matches", type=int, default=200, help="Reject combinations with fewer real images")
+    parser.add_argument("--quota_slack", type=float, default=1.5, help="Quota = ceil(N * share * slack)")
+    parser.add_argument("--no_quotas", action="store_true", help="Only de-duplicate")
+    parser.add_argument("--block_size", type=int, default=BLOCK_SIZE, help="Changing it changes the output")
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--check_workers", type=int, nargs="+", default=None,
+                        help="Only check that these worker counts produce identical files, e.g. 1 2 8")
+    args = parser.parse_args()
+    if not 1 <= args.num_attributes <= max_attributes(args.gender):
+        parser.error(f"--num_attributes must be between 1 and {max_attributes(args.gender)}")
+    if args.num_attributes != 3 and not args.no_quotas:
+        parser.error("Match statistics only cover 3 attributes; use --no_quotas with --num_attributes")
+
+    quotas = None if args.no_quotas else load_quotas(args.num_prompts, args.stats_csv, args.min_matches, args.quota_slack)
+    if args.check_workers:
+        print(f"Checking {args.num_prompts:,} prompts (seed {args.seed}) with workers {args.check_workers}...")
+        results = check_workers(args.check_workers, args.num_prompts, args.seed, gender=args.gender, quotas=quotas,
+                                block_size=args.block_size, num_attributes=args.num_attributes,
+                                phrasing=args.phrasing, style=args.style)
+        for workers, (digest, accepted) in results.items():
+            print(f"  workers={workers:<3} {accepted:>8,} prompts  sha1 {digest}")
+        identical = len({digest for digest, _ in results.values()}) == 1
+        print("✅ Identical output for every worker count." if identical else "❌ Output depends on the worker count.")
+        sys.exit(0 if identical else 1)
+
+    output = args.output or os.path.join(OUTPUT_DIR, f"prompts_n{args.num_prompts}_seed{args.seed}.jsonl")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    if quotas is not None and max_prompts(quotas, args.num_attributes) < args.num_prompts:
+        print(f"❌ At most {max_prompts(quotas, args.num_attributes):,} distinct prompts fit these quotas "
+              f"(--min_matches {args.min_matches}, --quota_slack {args.quota_slack}); lower -n or relax the quotas.")
+        sys.exit(1)
+
+    print(f"Generating {args.num_prompts:,} prompts (seed {args.seed}, {args.workers} workers)...")
+    stats = generate_prompt_set(args.num_prompts, args.seed, args.workers, args.gender, quotas, output,
+                                args.block_size, num_attributes=args.num_attributes,
+                                phrasing=args.phrasing, style=args.style)
+    summary = (f"{stats['accepted']:,} prompts from {stats['candidates']:,} candidates "
+               f"({stats['duplicates']:,} duplicates, {stats['over_quota']:,} over quota, "
+               f"{stats['no_quota']:,} below --min_matches)")
+    if stats["accepted"] < args.num_prompts:
+        print(f"❌ Only {stats['accepted']:,} of {args.num_prompts:,} prompts could be generated: {summary}. "
+              "Lower -n, raise --quota_slack / lower --min_matches, or add --phrasing/--style variety.")
+        print(f"Partial set saved to {output}")
+        sys.exit(1)
+    print(f"✅ {summary}")
+    print(f"Saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
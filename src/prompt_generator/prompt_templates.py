@@ -0,0 +1,166 @@
+"""
+Prompt Templates
+Single place where CelebA attributes are turned into prompt text.
+
+A template = phrasing + optional style suffix, e.g.
+    "A realistic portrait of a {gender}, with {attributes}." + " Neutral background, ..."
+{attributes} takes any number of attributes ("a", "a and b", "a, b, and c", ...).
+
+Templates are compiled once into literal/field pieces. render_batch() builds whole
+columns of prompts with elementwise string concatenation on NumPy object arrays
+(grouped by attribute count), instead of formatting each row in Python.
+
+    template = PromptTemplate("portrait", style="studio")
+    template.render("male", ["Goatee", "Bald"])
+    template.render_batch(genders, attribute_lists)
+"""
+import string
+import numpy as np
+
+# Attribute to natural language mapping
+ATTR_TO_TEXT = {
+    # Facial Hair
+    "5_o_Clock_Shadow": "a five o'clock shadow",
+    "Goatee": "a goatee",
+    "Mustache": "a mustache",
+    "Sideburns": "sideburns",
+    # Makeup & Style
+    "Wearing_Lipstick": "wearing lipstick",
+    "Heavy_Makeup": "heavy makeup",
+    "Wearing_Earrings": "wearing earrings",
+    "Wearing_Necklace": "wearing a necklace",
+    # Hair Structure
+    "Straight_Hair": "straight hair",
+    "Wavy_Hair": "wavy hair",
+    "Receding_Hairline": "a receding hairline",
+    "Bangs": "bangs",
+    "Bald": "a bald head",
+    # Hair Color
+    "Black_Hair": "black hair",
+    "Brown_Hair": "brown hair",
+    "Blond_Hair": "blond hair",
+    "Gray_Hair": "gray hair",
+    # Face Shape
+    "High_Cheekbones": "high cheekbones",
+    "Oval_Face": "an oval face",
+    "Double_Chin": "a double chin",
+    "Chubby": "chubby cheeks",
+    # Eyebrows
+    "Bushy_Eyebrows": "bushy eyebrows",
+    "Arched_Eyebrows": "arched eyebrows",
+    # Nose
+    "Big_Nose": "a prominent nose",
+    "Pointy_Nose": "a pointy nose",
+    # Other
+    "Young": "a youthful appearance",
+    "Attractive": "an attractive look",
+    "Smiling": "a smile",
+    "Mouth_Slightly_Open": "slightly parted lips",
+    "Bags_Under_Eyes": "bags under the eyes",
+    "Big_Lips": "full lips",
+    "Narrow_Eyes": "narrow eyes",
+    "Rosy_Cheeks": "rosy cheeks",
+    "Pale_Skin": "pale skin",
+    "Eyeglasses": "wearing eyeglasses",
+    "Wearing_Hat": "wearing a hat",
+    "Wearing_Necktie": "wearing a necktie",
+}
+
+GENDER_WORDS = {"male": "man", "female": "woman"}
+
+PHRASINGS = {
+    "portrait": "A realistic portrait of a {gender}, with {attributes}.",
+    "photo": "A photorealistic portrait of a {gender}, with {attributes}.",
+    "closeup": "A close-up photo of a {gender} with {attributes}.",
+    "headshot": "A headshot of a {gender} with {attributes}.",
+}
+
+STYLE_SUFFIXES = {
+    "none": "",
+    "studio": " Neutral background, natural lighting, close-up face.",
+    "film": " Shot on 35mm film, soft light, shallow depth of field.",
+    "dslr": " DSLR photo, sharp focus, high detail.",
+}
+
+FIELDS = ("gender", "attributes")
+
+
+def attribute_text(attr):
+    return ATTR_TO_TEXT.get(attr, attr.lower().replace("_", " "))
+
+
+def join_attributes(texts):
+    """["a"] -> "a", ["a", "b"] -> "a and b", ["a", "b", "c"] -> "a, b, and c"."""
+    if len(texts) <= 2:
+        return " and ".join(texts)
+    return ", ".join(texts[:-1]) + ", and " + texts[-1]
+
+
+class PromptTemplate:
+    def __init__(self, phrasing="portrait", style="none"):
+        """`phrasing` / `style`: a key of PHRASINGS / STYLE_SUFFIXES, or a literal template string."""
+        self.text = PHRASINGS.get(phrasing, phrasing) + STYLE_SUFFIXES.get(style, style)
+        self.pieces = []  # [(literal, field or None)]
+        for literal, field, _, _ in string.Formatter().parse(self.text):
+            if field is not None and field not in FIELDS:
+                raise ValueError(f"Unknown template field '{{{field}}}' (expected one of {FIELDS})")
+            self.pieces.append((literal, field))
+
+    def render(self, gender, attributes):
+        values = {
+            "gender": GENDER_WORDS.get(gender, gender),
+            "attributes": join_attributes([attribute_text(a) for a in attributes]),
+        }
+        return "".join(literal + (values[field] if field else "") for literal, field in self.pieces)
+
+    def render_batch(self, genders, attribute_lists):
+        """
+        Prompts for parallel sequences of genders and attribute lists (lists may differ in length).
+        Each distinct (gender, attributes) row is rendered once, column-wise over all distinct
+        rows; the output is then gathered by index.
+        """
+        keys = {}
+        codes = np.fromiter(
+            (keys.setdefault((g, tuple(a)), len(keys)) for g, a in zip(genders, attribute_lists)),
+            dtype=np.int64, count=len(genders),
+        )
+        unique_genders = [g for g, _ in keys]
+        gender_col = np.array([GENDER_WORDS.get(g, g) for g in unique_genders], dtype=object)
+        attr_col = _join_attribute_column([a for _, a in keys])
+
+        out = np.full(len(keys), "", dtype=object)
+        for literal, field in self.pieces:
+            if literal:
+                out = out + literal
+            if field == "gender":
+                out = out + gender_col
+            elif field == "attributes":
+                out = out + attr_col
+        return out[codes].tolist()
+
+
+def _join_attribute_column(attribute_lists):
+    """join_attributes() for every row, computed column by column per attribute count."""
+    n = len(attribute_lists)
+    out = np.full(n, "", dtype=object)
+    lengths = np.fromiter((len(a) for a in attribute_lists), dtype=np.int64, count=n)
+    text = {}
+
+    for length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == length)
+        if length == 0:
+            continue
+        # (rows, length) attribute text, one lookup per distinct attribute
+        texts = np.empty((len(rows), length), dtype=object)
+        for i, r in enumerate(rows):
+            texts[i] = [text[a] if a in text else text.setdefault(a, attribute_text(a)) for a in attribute_lists[r]]
+
+        joined = texts[:, 0].copy()
+        for col in range(1, length):
+            sep = " and " if length == 2 else (", and " if col == length - 1 else ", ")
+            joined = joined + sep + texts[:, col]
+        out[rows] = joined
+    return out
+
+
+DEFAULT_TEMPLATE = PromptTemplate()
@@ -0,0 +1,246 @@
+"""
+Generated-vs-CelebA Quality Metrics
+Scores generated images against the real CelebA images matching the same prompt
+(gender + 3 attributes), instead of comparing them by eye in the prompt dashboard.
+
+Per (prompt, model) it reports:
+- fid: Frechet distance between Gaussian fits of generated and real features
+- kid: kernel inception distance (unbiased polynomial-kernel MMD), needs >= 2 generated images
+- feature_dist: distance between generated and real feature means (usable with a single image)
+- rgb_delta / brightness_delta / saturation_delta: cheap pixel/colour statistics
+
+Real-subset statistics are cached on disk per (extractor, gender, attributes, sample size),
+and real-image features are memoised per run, so thousands of prompts sharing the same
+CelebA images only extract each image once.
+
+    python src/prompt_generator/quality_metrics.py --manifest_dir out/reference --extractor tiny
+"""
+import os
+import csv
+import json
+import random
+import argparse
+import numpy as np
+from PIL import Image
+
+from celeba_attrs import load_attributes, attribute_sets
+from image_features import get_extractor, resolve_image_path, load_images
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+CSV_PATH = os.path.join(project_root, "res", "list_attr_celeba.csv")
+IMG_ALIGNED_PATH = os.path.join(project_root, "res", "img_align_celeba_png")
+STATS_CACHE_DIR = os.path.join(project_root, ".cache", "eval_stats")
+
+
+# === DISTRIBUTION METRICS ===
+
+def gaussian_stats(features):
+    mu = features.mean(axis=0, dtype=np.float64)
+    sigma = np.cov(features, rowvar=False) if len(features) > 1 else np.zeros((features.shape[1],) * 2)
+    return mu, sigma
+
+
+def _sqrtm_psd(matrix):
+    eigvals, eigvecs = np.linalg.eigh(matrix)
+    return (eigvecs * np.sqrt(np.clip(eigvals, 0, None))) @ eigvecs.T
+
+
+def frechet_distance(mu1, sigma1, mu2, sigma2):
+    """||mu1 - mu2||^2 + Tr(S1 + S2 - 2 sqrt(S1 S2)), via symmetric eigendecompositions (no scipy)."""
+    sqrt_s1 = _sqrtm_psd(sigma1)
+    cross = sqrt_s1 @ sigma2 @ sqrt_s1
+    tr_covmean = np.sqrt(np.clip(np.linalg.eigvalsh((cross + cross.T) / 2), 0, None)).sum()
+    diff = mu1 - mu2
+    return float(diff @ diff + np.trace(sigma1) + np.trace(sigma2) - 2 * tr_covmean)
+
+
+def kernel_distance(real, gen):
+    """Unbiased MMD^2 with the cubic polynomial kernel k(x, y) = (x.y / d + 1)^3."""
+    m, n = len(gen), len(real)
+    if m < 2 or n < 2:
+        return float("nan")
+    d = real.shape[1]
+    k_rr = (real @ real.T / d + 1) ** 3
+    k_gg = (gen @ gen.T / d + 1) ** 3
+    k_rg = (real @ gen.T / d + 1) ** 3
+    return float(
+        (k_rr.sum() - np.trace(k_rr)) / (n * (n - 1))
+        + (k_gg.sum() - np.trace(k_gg)) / (m * (m - 1))
+        - 2 * k_rg.mean()
+    )
+
+
+# === PIXEL / COLOUR STATISTICS ===
+
+def pixel_stats(images, size=64):
+    """Mean RGB, brightness and saturation per image -> (N, 5) array in [0, 1]."""
+    stats = np.empty((len(images), 5), dtype=np.float32)
+    for i, img in enumerate(images):
+        small = img.convert("RGB").resize((size, size), Image.BILINEAR)
+        rgb = np.asarray(small, dtype=np.float32) / 255.0
+        hsv = np.asarray(small.convert("HSV"), dtype=np.float32) / 255.0
+        stats[i, :3] = rgb.reshape(-1, 3).mean(axis=0)
+        stats[i, 3] = hsv[..., 2].mean()
+        stats[i, 4] = hsv[..., 1].mean()
+    return stats
+
+
+def compare_pixel_stats(gen_stats, real_stats):
+    g, r = gen_stats.mean(axis=0), real_stats.mean(axis=0)
+    return {
+        "rgb_delta": float(np.linalg.norm(g[:3] - r[:3])),
+        "brightness_delta": float(g[3] - r[3]),
+        "saturation_delta": float(g[4] - r[4]),
+    }
+
+
+# === REAL SUBSET STATISTICS (CACHED) ===
+
+class RealStatsCache:
+    """
+    Feature statistics of the CelebA subset matching (gender, attributes).
+    Disk cache: one .npz per subset. Memory cache: features per real image ID.
+    """
+
+    def __init__(self, extractor, attr_sets, image_dir=IMG_ALIGNED_PATH, samples=256, seed=0,
+                 cache_dir=STATS_CACHE_DIR):
+        self.extractor = extractor
+        self.attr_sets = attr_sets
+        self.image_dir = image_dir
+        self.samples = samples
+        self.seed = seed
+        self.cache_dir = os.path.join(cache_dir, extractor.name)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.image_features = {}
+        self.image_pixels = {}
+
+    def matching_ids(self, gender, attributes):
+        match = set.intersection(*(self.attr_sets.get(a, set()) for a in attributes))
+        male = self.attr_sets.get("Male", set())
+        return sorted(match & male if gender == "male" else match - male)
+
+    def _extract(self, img_ids):
+        """Features + pixel stats for real images, reusing anything seen before in this run."""
+        todo = [i for i in img_ids if i not in self.image_features]
+        paths = [resolve_image_path(self.image_dir, i) for i in todo]
+        found = [(i, p) for i, p in zip(todo, paths) if p]
+        for start in range(0, len(found), self.extractor.batch_size):
+            batch = found[start:start + self.extractor.batch_size]
+            images = load_images([p for _, p in batch])
+            feats = self.extractor(images)
+            pixels = pixel_stats(images)
+            for (img_id, _), f, px in zip(batch, feats, pixels):
+                self.image_features[img_id] = f
+                self.image_pixels[img_id] = px
+        ids = [i for i in img_ids if i in self.image_features]
+        return (np.stack([self.image_features[i] for i in ids]) if ids else np.empty((0, self.extractor.dim), np.float32),
+                np.stack([self.image_pixels[i] for i in ids]) if ids else np.empty((0, 5), np.float32))
+
+    def get(self, gender, attributes):
+        """Returns dict with features, mu, sigma, pixels, count (None if no matching images)."""
+        key = f"{gender}_{'-'.join(sorted(attributes))}_n{self.samples}_s{self.seed}"
+        path = os.path.join(self.cache_dir, key + ".npz")
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return {k: data[k] for k in data.files}
+
+        ids = self.matching_ids(gender, attributes)
+        if not ids:
+            return None
+        total = len(ids)
+        if len(ids) > self.samples:
+            ids = sorted(random.Random(self.seed).sample(ids, self.samples))
+        features, pixels = self._extract(ids)
+        if len(features) == 0:
+            return None
+        mu, sigma = gaussian_stats(features)
+        stats = {"features": features, "mu": mu, "sigma": sigma, "pixels": pixels, "count": np.array(total)}
+        np.savez(path, **stats)
+        return stats
+
+
+def evaluate_group(gen_features, gen_pixels, real):
+    """Metrics for one set of generated images against precomputed real stats."""
+    mu_g, sigma_g = gaussian_stats(gen_features)
+    return {
+        "fid": frechet_distance(mu_g, sigma_g, real["mu"], real["sigma"]),
+        "kid": kernel_distance(real["features"], gen_features),
+        "feature_dist": float(np.linalg.norm(mu_g - real["mu"])),
+        **compare_pixel_stats(gen_pixels, real["pixels"]),
+    }
+
+
+def load_manifest_records(manifest_dir):
+    """Completed bulk_generate.py records, grouped by (gender, sorted attributes, model)."""
+    groups = {}
+    for name in sorted(os.listdir(manifest_dir)):
+        if not (name.startswith("manifest-") and name.endswith(".jsonl")):
+            continue
+        with open(os.path.join(manifest_dir, name)) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("status") != "ok":
+                    continue
+                key = (record["gender"], tuple(sorted(record["attributes"])), record["model"])
+                groups.setdefault(key, {"prompt": record["prompt"], "paths": []})
+                groups[key]["paths"].append(os.path.join(manifest_dir, record["path"]))
+    return groups
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest_dir", type=str, default="out/reference",
+                        help="Output dir of bulk_generate.py (manifest-*.jsonl)")
+    parser.add_argument("--extractor", type=str, default="tiny")
+    parser.add_argument("--real_samples", type=int, default=256, help="Max real images per subset")
+    parser.add_argument("--csv_path", type=str, default=CSV_PATH)
+    parser.add_argument("--image_dir", type=str, default=IMG_ALIGNED_PATH)
+    parser.add_argument("--output", type=str, default="out/reference/metrics.csv")
+    args = parser.parse_args()
+
+    extractor = get_extractor(args.extractor)
+    attr_sets = attribute_sets(*load_attributes(args.csv_path, exclude_blurry=True))
+    cache = RealStatsCache(extractor, attr_sets, args.image_dir, args.real_samples)
+
+    groups = load_manifest_records(args.manifest_dir)
+    print(f"Evaluating {len(groups):,} (prompt, model) groups with '{extractor.name}' features...")
+
+    # Extract all generated features in large batches up front (one decode per image)
+    all_paths = [p for _, g in sorted(groups.items()) for p in g["paths"]]
+    gen_features = np.empty((len(all_paths), extractor.dim), dtype=np.float32)
+    gen_pixels = np.empty((len(all_paths), 5), dtype=np.float32)
+    for start in range(0, len(all_paths), extractor.batch_size):
+        images = load_images(all_paths[start:start + extractor.batch_size])
+        gen_features[start:start + len(images)] = extractor(images)
+        gen_pixels[start:start + len(images)] = pixel_stats(images)
+
+    rows = []
+    offset = 0
+    for (gender, attributes, model), group in sorted(groups.items()):
+        n = len(group["paths"])
+        feats, pixels = gen_features[offset:offset + n], gen_pixels[offset:offset + n]
+        offset += n
+
+        real = cache.get(gender, attributes)
+        if real is None:
+            continue
+        metrics = evaluate_group(feats, pixels, real)
+        rows.append({
+            "gender": gender, "attributes": "-".join(attributes), "model": model,
+            "generated": n, "real": int(real["count"]), "prompt": group["prompt"], **metrics
+        })
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0].keys()) if rows else ["gender"])
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Saved {len(rows):,} rows to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Rerun Profiler for the Streamlit dashboards
+Streamlit re-executes a dashboard top to bottom on every widget interaction. This times
+named sections of each rerun, counts hits/misses of st.cache_data functions, shows a
+collapsible perf panel and appends one JSON line per rerun to out/perf/<dashboard>.jsonl.
+
+Enable with DASHBOARD_PROFILE=True in .env or by opening the dashboard with ?profile=1.
+When disabled, sections are no-ops and cache_data() is plain st.cache_data.
+
+    profiler = get_profiler("prompt_dashboard")
+
+    @profiler.cache_data
+    def load_dataset(): ...
+
+    with profiler.section("matching scan"):
+        ...
+
+    profiler.finish()   # last line of the script
+
+Convert a trace for chrome://tracing or https://ui.perfetto.dev:
+    python src/prompt_generator/rerun_profiler.py out/perf/prompt_dashboard.jsonl
+"""
+import os
+import json
+import time
+import argparse
+import contextlib
+import functools
+from dotenv import load_dotenv
+load_dotenv()
+
+PROFILE_ENV = os.getenv("DASHBOARD_PROFILE", "False").lower() in ("true", "1", "yes")
+TRACE_DIR = os.path.join("out", "perf")
+
+
+class RerunProfiler:
+    def __init__(self, name, enabled):
+        self.name = name
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.wall_start = time.time()
+        self.sections = []
+        self.cache_calls = []
+        self._misses = {}
+
+    def section(self, label):
+        if not self.enabled:
+            return contextlib.nullcontext()
+        return self._timed(label)
+
+    @contextlib.contextmanager
+    def _timed(self, label):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections.append({"name": label, "start": t0 - self.start, "duration": time.perf_counter() - t0})
+
+    def cache_data(self, func=None, **cache_kwargs):
+        """Drop-in for @st.cache_data that also records whether each call was a cache hit."""
+        import streamlit as st
+        if func is None:
+            return functools.partial(self.cache_data, **cache_kwargs)
+        if not self.enabled:
+            return st.cache_data(func, **cache_kwargs)
+
+        name = func.__name__
+
+        @functools.wraps(func)
+        def body(*args, **kwargs):
+            # Only runs on a cache miss
+            self._misses[name] = self._misses.get(name, 0) + 1
+            return func(*args, **kwargs)
+
+        cached = st.cache_data(body, **cache_kwargs)
+
+        @functools.wraps(func)
+        def counted(*args, **kwargs):
+            misses = self._misses.get(name, 0)
+            t0 = time.perf_counter()
+            result = cached(*args, **kwargs)
+            self.cache_calls.append({
+                "name": name,
+                "hit": self._misses.get(name, 0) == misses,
+                "start": t0 - self.start,
+                "duration": time.perf_counter() - t0,
+            })
+            return result
+
+        return counted
+
+    def finish(self):
+        """Render the perf panel and append this rerun to the trace file."""
+        if not self.enabled:
+            return
+        import streamlit as st
+        import pandas as pd
+        total = time.perf_counter() - self.start
+
+        with st.expander(f"⏱️ Perf: rerun took {total * 1000:.0f} ms"):
+            if self.sections:
+                df = pd.DataFrame(self.sections)
+                df["ms"] = (df["duration"] * 1000).round(1)
+                df["share"] = (df["duration"] / total * 100).round(1).astype(str) + "%"
+                st.dataframe(df[["name", "ms", "share"]], width='stretch', hide_index=True)
+            if self.cache_calls:
+                cache_df = pd.DataFrame(self.cache_calls)
+                summary = cache_df.groupby("name").agg(
+                    calls=("hit", "size"), hits=("hit", "sum"), ms=("duration", lambda d: round(d.sum() * 1000, 1))
+                )
+                st.caption("st.cache_data")
+                st.dataframe(summary, width='stretch')
+
+        os.makedirs(TRACE_DIR, exist_ok=True)
+        with open(os.path.join(TRACE_DIR, f"{self.name}.jsonl"), "a") as f:
+            f.write(json.dumps({
+                "dashboard": self.name,
+                "timestamp": self.wall_start,
+                "total": total,
+                "sections": self.sections,
+                "cache_calls": self.cache_calls,
+            }) + "\n")
+
+
+def get_profiler(name):
+    """Profiler for the current rerun; enabled by DASHBOARD_PROFILE or the ?profile=1 URL parameter."""
+    import streamlit as st
+    enabled = PROFILE_ENV or st.query_params.get("profile") in ("1", "true")
+    return RerunProfiler(name, enabled)
+
+
+def to_chrome_trace(jsonl_path, output_path=None):
+    """Convert a rerun trace (JSONL) into Chrome trace-event format."""
+    events = []
+    with open(jsonl_path) as f:
+        for line in f:
+            rerun = json.loads(line)
+            base_us = rerun["timestamp"] * 1e6
+            events.append({"name": "rerun", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": base_us, "dur": rerun["total"] * 1e6})
+            for s in rerun["sections"]:
+                events.append({"name": s["name"], "ph": "X", "pid": 1, "tid": 2,
+                               "ts": base_us + s["start"] * 1e6, "dur": s["duration"] * 1e6})
+            for c in rerun["cache_calls"]:
+                events.append({"name": f"{c['name']} ({'hit' if c['hit'] else 'miss'})", "ph": "X", "pid": 1, "tid": 3,
+                               "ts": base_us + c["start"] * 1e6, "dur": c["duration"] * 1e6})
+    output_path = output_path or os.path.splitext(jsonl_path)[0] + "_trace.json"
+    with open(output_path, "w") as f:
+        json.dump({"traceEvents": events}, f)
+    return output_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace", type=str, help="out/perf/<dashboard>.jsonl")
+    parser.add_argument("--output", type=str, default=None)
+    args = parser.parse_args()
+    print(f"Saved {to_chrome_trace(args.trace, args.output)}")
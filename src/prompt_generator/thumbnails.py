@@ -0,0 +1,92 @@
+"""
+Thumbnail Service
+Serves downscaled CelebA images for the prompt explorer grid.
+
+- Image IDs are resolved through a filename index built with one directory scan
+  (and persisted next to the cache), instead of probing .png/.jpg/.jpeg per image.
+- Thumbnails are cached on disk in 256 hash shards: .cache/thumbnails/<dataset>/<size>/<xx>/<stem>.jpg
+- Missing thumbnails are generated concurrently on a thread pool; JPEG draft mode
+  decodes the large img_celeba files at reduced resolution.
+"""
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+project_root = os.path.abspath(os.path.join(current_dir, "..", ".."))
+THUMB_CACHE_ROOT = os.path.join(project_root, ".cache", "thumbnails")
+THUMB_SIZE = 256
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+def build_filename_index(image_dir, cache_dir=None):
+    """{stem: filename} for all images in `image_dir`. Persisted in `cache_dir`, keyed by the dir's mtime."""
+    index_path = os.path.join(cache_dir, "filenames.json") if cache_dir else None
+    dir_mtime = os.stat(image_dir).st_mtime
+    if index_path and os.path.exists(index_path):
+        with open(index_path) as f:
+            saved = json.load(f)
+        if saved.get("mtime") == dir_mtime:
+            return saved["files"]
+
+    files = {}
+    with os.scandir(image_dir) as entries:
+        for entry in entries:
+            stem, ext = os.path.splitext(entry.name)
+            if ext.lower() in IMAGE_EXTENSIONS:
+                files.setdefault(stem, entry.name)
+
+    if index_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"mtime": dir_mtime, "files": files}, f)
+        os.replace(tmp_path, index_path)
+    return files
+
+
+class ThumbnailService:
+    def __init__(self, image_dir, size=THUMB_SIZE, cache_root=THUMB_CACHE_ROOT, max_workers=8):
+        self.image_dir = image_dir
+        self.size = size
+        dataset = os.path.basename(os.path.normpath(image_dir))
+        self.cache_dir = os.path.join(cache_root, dataset, str(size))
+        self.files = build_filename_index(image_dir, os.path.join(cache_root, dataset)) if os.path.isdir(image_dir) else {}
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="thumbnails")
+
+    def resolve(self, img_id):
+        """Full-size image path for an ID like '000001.jpg', or None."""
+        filename = self.files.get(os.path.splitext(img_id)[0])
+        return os.path.join(self.image_dir, filename) if filename else None
+
+    def thumb_path(self, img_id):
+        stem = os.path.splitext(img_id)[0]
+        shard = hashlib.md5(stem.encode()).hexdigest()[:2]
+        return os.path.join(self.cache_dir, shard, stem + ".jpg")
+
+    def get(self, img_id):
+        """Path of the cached thumbnail, creating it if needed. None if the image does not exist."""
+        thumb_path = self.thumb_path(img_id)
+        if os.path.exists(thumb_path):
+            return thumb_path
+        src = self.resolve(img_id)
+        if src is None:
+            return None
+
+        with Image.open(src) as img:
+            img.draft("RGB", (self.size, self.size))  # JPEG: decode at reduced scale
+            img = img.convert("RGB")
+            img.thumbnail((self.size, self.size), Image.BILINEAR)
+            os.makedirs(os.path.dirname(thumb_path), exist_ok=True)
+            # Unique per process and thread: concurrent get() calls for one image must not share it
+            tmp_path = f"{thumb_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, format="JPEG", quality=85)
+        os.replace(tmp_path, thumb_path)
+        return thumb_path
+
+    def get_many(self, img_ids):
+        """Thumbnails for several IDs, generated concurrently. Order matches `img_ids`."""
+        return list(self.pool.map(self.get, img_ids))